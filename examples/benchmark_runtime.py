@@ -80,11 +80,10 @@ if __name__ == "__main__":
                 im_batch_numpy = utils.load_image_batch(config.image_file, batch_size, im_size)
                 im_batch_torch = torch.from_numpy(im_batch_numpy).to(device)
 
-                # NumPy implementation
+                # NumPy implementation, the whole batch [N,1,H,W] in one call
                 start_time = time.time()
 
-                for image in im_batch_numpy:
-                    coeff = pyr_numpy.build(image[0,])
+                coeff = pyr_numpy.build(im_batch_numpy)
 
                 duration = time.time()-start_time
                 durations_numpy[batch_idx,size_idx,run_idx] = duration
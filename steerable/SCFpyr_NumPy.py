@@ -17,8 +17,9 @@ from __future__ import division
 from __future__ import print_function
 
 import numpy as np
-from scipy.misc import factorial
+from scipy.special import factorial
 
+import steerable.fft_backend as fft_backend_lib
 import steerable.math_utils as math_utils
 pointOp = math_utils.pointOp
         
@@ -45,10 +46,15 @@ class SCFpyr_NumPy():
 
     '''
 
-    def __init__(self, height=5, nbands=4, scale_factor=2):
+    def __init__(self, height=5, nbands=4, scale_factor=2, downsample_bands=False,
+                 fft_backend=None, fft_workers=None):
         self.nbands  = nbands  # number of orientation bands
         self.height  = height  # including low-pass and high-pass
         self.scale_factor = scale_factor
+        self.downsample_bands = downsample_bands  # crop bands to their support
+
+        # FFT implementation, see `steerable.fft_backend`
+        self.fft = fft_backend_lib.get_backend(fft_backend, fft_workers)
         
         # Cache constants
         self.lutsize = 1024
@@ -64,14 +70,25 @@ class SCFpyr_NumPy():
         The pyramid typically has ~4 levels and 4-8 orientations. 
         
         Args:
-            im_batch (np.ndarray): single image [H,W]
+            im (np.ndarray): single image [H,W], or a stack of images
+                [N,H,W] or [N,C,H,W]
         
         Returns:
-            pyramid: list containing np.ndarray objects storing the pyramid
+            pyramid: list containing np.ndarray objects storing the pyramid.
+                With `downsample_bands` each orientation band is sampled on
+                the (smaller) bounding box of its frequency support. For
+                stacks all arrays have the leading axes of `im`, the masks
+                are computed once and broadcast over the stack.
         '''
+        return list(self.iter_build(im))
+
+    def iter_build(self, im):
+        ''' Generator version of `build`, yields the high-pass residual, the
+        orientation bands of each level and the low-pass residual one at a
+        time. Spectra of finer levels are released while descending. '''
 
-        assert len(im.shape) == 2, 'Input im must be grayscale'
-        height, width = im.shape
+        assert im.ndim in (2, 3, 4), 'Input im must be grayscale [H,W], [N,H,W] or [N,C,H,W]'
+        height, width = im.shape[-2:]
 
         # Check whether image size is sufficient for number of levels
         if self.height > int(np.floor(np.log2(min(width, height))) - 2):
@@ -88,30 +105,36 @@ class SCFpyr_NumPy():
         lo0mask = pointOp(log_rad, YIrcos, Xrcos)
         hi0mask = pointOp(log_rad, Yrcos, Xrcos)
 
+        imdft = self.fft.fft2(im)
+
+        # High-pass, real-valued so only the half spectrum is needed
+        hi0dft = imdft[...,:width//2+1] * self.fft.ifftshift(hi0mask)[:,:width//2+1]
+        hi0 = self.fft.irfft2(hi0dft, (height, width))
+        del hi0dft
+
         # Shift the zero-frequency component to the center of the spectrum.
-        imdft = np.fft.fftshift(np.fft.fft2(im))
+        imdft = self.fft.fftshift(imdft, axes=(-2,-1))
 
         # Low-pass
         lo0dft = imdft * lo0mask
+        del imdft
 
-        # Recursive build the steerable pyramid
-        coeff = self._build_levels(lo0dft, log_rad, angle, Xrcos, Yrcos, self.height-1)
+        yield hi0
+        del hi0
 
-        # High-pass
-        hi0dft = imdft * hi0mask
-        hi0 = np.fft.ifft2(np.fft.ifftshift(hi0dft))
-        coeff.insert(0, hi0.real)
-        return coeff
+        # Recursive build the steerable pyramid
+        for coeff in self._build_levels(lo0dft, log_rad, angle, Xrcos, Yrcos, self.height-1, lo0mask != 0):
+            yield coeff
 
 
-    def _build_levels(self, lodft, log_rad, angle, Xrcos, Yrcos, height):
+    def _build_levels(self, lodft, log_rad, angle, Xrcos, Yrcos, height, support):
 
         if height <= 1:
 
-            # Low-pass
-            lo0 = np.fft.ifftshift(lodft)
-            lo0 = np.fft.ifft2(lo0)
-            coeff = [lo0.real]
+            # Low-pass, real-valued so only the half spectrum is needed
+            lo0 = self.fft.ifftshift(lodft, axes=(-2,-1))[...,:lodft.shape[-1]//2+1]
+            lo0 = self.fft.irfft2(lo0, lodft.shape[-2:])
+            yield lo0
 
         else:
             
@@ -131,15 +154,23 @@ class SCFpyr_NumPy():
             orientations = []
             for b in range(self.nbands):
                 anglemask = pointOp(angle, Ycosn, self.Xcosn + np.pi*b/self.nbands)
-                banddft = np.power(np.complex(0, -1), self.nbands - 1) * lodft * anglemask * himask
-                band = np.fft.ifft2(np.fft.ifftshift(banddft))
+                banddft = np.power(complex(0, -1), self.nbands - 1) * lodft * anglemask * himask
+                if self.downsample_bands:
+                    box = self._band_box(support & (anglemask != 0))
+                    band = self._ifft2_box(banddft, box)
+                else:
+                    band = self.fft.ifft2(self.fft.ifftshift(banddft, axes=(-2,-1)))
                 orientations.append(band)
+            del banddft
+
+            yield orientations
+            del orientations
 
             ####################################################################
             ######################## Subsample lowpass #########################
             ####################################################################
 
-            dims = np.array(lodft.shape)
+            dims = np.array(lodft.shape[-2:])
 
             # Both are tuples of size 2
             low_ind_start = (np.ceil((dims+0.5)/2) - np.ceil((np.ceil((dims-0.5)/2)+0.5)/2)).astype(int)
@@ -148,21 +179,21 @@ class SCFpyr_NumPy():
             # Selection
             log_rad = log_rad[low_ind_start[0]:low_ind_end[0], low_ind_start[1]:low_ind_end[1]]
             angle   = angle[low_ind_start[0]:low_ind_end[0], low_ind_start[1]:low_ind_end[1]]
-            lodft   = lodft[low_ind_start[0]:low_ind_end[0], low_ind_start[1]:low_ind_end[1]]
+            lodft   = lodft[...,low_ind_start[0]:low_ind_end[0], low_ind_start[1]:low_ind_end[1]]
+            support = support[low_ind_start[0]:low_ind_end[0], low_ind_start[1]:low_ind_end[1]]
 
             # Subsampling in frequency domain
             YIrcos = np.abs(np.sqrt(1 - Yrcos**2))
             lomask = pointOp(log_rad, YIrcos, Xrcos)
             lodft = lomask * lodft
+            support = support & (lomask != 0)
 
             ####################################################################
             ####################### Recursion next level #######################
             ####################################################################
 
-            coeff = self._build_levels(lodft, log_rad, angle, Xrcos, Yrcos, height-1)
-            coeff.insert(0, orientations)
-
-        return coeff
+            for coeff in self._build_levels(lodft, log_rad, angle, Xrcos, Yrcos, height-1, support):
+                yield coeff
 
     ############################################################################
     ########################### RECONSTRUCTION #################################
@@ -173,7 +204,7 @@ class SCFpyr_NumPy():
         if self.nbands != len(coeff[1]):
             raise Exception("Unmatched number of orientations")
 
-        height, width = coeff[0].shape
+        height, width = coeff[0].shape[-2:]
         log_rad, angle = math_utils.prepare_grid(height, width)
 
         Xrcos, Yrcos = math_utils.rcosFn(1, -0.5)
@@ -183,22 +214,24 @@ class SCFpyr_NumPy():
         lo0mask = pointOp(log_rad, YIrcos, Xrcos)
         hi0mask = pointOp(log_rad, Yrcos, Xrcos)
 
-        tempdft = self._reconstruct_levels(coeff[1:], log_rad, Xrcos, Yrcos, angle)
+        tempdft = self._reconstruct_levels(coeff[1:], log_rad, Xrcos, Yrcos, angle, lo0mask != 0)
 
-        hidft = np.fft.fftshift(np.fft.fft2(coeff[0]))
-        outdft = tempdft * lo0mask + hidft * hi0mask
+        # The real part of the reconstruction only depends on the Hermitian
+        # part of the spectrum, so the final stage works on half spectra
+        tempdft = math_utils.hermitian_half_numpy(self.fft.ifftshift(tempdft, axes=(-2,-1)))
+        hidft = self.fft.rfft2(coeff[0])
+        outdft = tempdft * self.fft.ifftshift(lo0mask)[:,:width//2+1] + \
+                 hidft * self.fft.ifftshift(hi0mask)[:,:width//2+1]
 
-        reconstruction = np.fft.ifftshift(outdft)
-        reconstruction = np.fft.ifft2(reconstruction)
-        reconstruction = reconstruction.real
+        reconstruction = self.fft.irfft2(outdft, (height, width))
 
         return reconstruction
 
-    def _reconstruct_levels(self, coeff, log_rad, Xrcos, Yrcos, angle):
+    def _reconstruct_levels(self, coeff, log_rad, Xrcos, Yrcos, angle, support):
 
         if len(coeff) == 1:
-            dft = np.fft.fft2(coeff[0])
-            dft = np.fft.fftshift(dft)
+            dft = self.fft.fft2(coeff[0])
+            dft = self.fft.fftshift(dft, axes=(-2,-1))
             return dft
 
         Xrcos = Xrcos - np.log2(self.scale_factor)
@@ -215,19 +248,25 @@ class SCFpyr_NumPy():
         const = np.power(2, 2*order) * np.square(factorial(order)) / (self.nbands * factorial(2*order))
         Ycosn = np.sqrt(const) * np.power(np.cos(Xcosn), order)
 
-        orientdft = np.zeros(coeff[0][0].shape)
+        orientdft = np.zeros(coeff[0][0].shape[:-2] + log_rad.shape)
 
         for b in range(self.nbands):
             anglemask = pointOp(angle, Ycosn, Xcosn + np.pi * b/self.nbands)
-            banddft = np.fft.fft2(coeff[0][b])
-            banddft = np.fft.fftshift(banddft)
-            orientdft = orientdft + np.power(np.complex(0, 1), order) * banddft * anglemask * himask
+            if self.downsample_bands:
+                # Support of the band follows the angular window used in build
+                window = pointOp(angle, Ycosn * (np.abs(self.alpha) < np.pi/2), Xcosn + np.pi * b/self.nbands)
+                box = self._band_box(support & (window != 0))
+                banddft = self._fft2_box(coeff[0][b], box, log_rad.shape)
+            else:
+                banddft = self.fft.fft2(coeff[0][b])
+                banddft = self.fft.fftshift(banddft, axes=(-2,-1))
+            orientdft = orientdft + np.power(complex(0, 1), order) * banddft * anglemask * himask
 
         ####################################################################
         ########## Lowpass component are upsampled and convoluted ##########
         ####################################################################
 
-        dims = np.array(coeff[0][0].shape)
+        dims = np.array(log_rad.shape)
 
         lostart = (np.ceil((dims+0.5)/2) - np.ceil((np.ceil((dims-0.5)/2)+0.5)/2)).astype(np.int32)
         loend = lostart + np.ceil((dims-0.5)/2).astype(np.int32)
@@ -236,13 +275,49 @@ class SCFpyr_NumPy():
         nangle = angle[lostart[0]:loend[0], lostart[1]:loend[1]]
         YIrcos = np.sqrt(np.abs(1 - Yrcos**2))
         lomask = pointOp(nlog_rad, YIrcos, Xrcos)
+        nsupport = support[lostart[0]:loend[0], lostart[1]:loend[1]] & (lomask != 0)
 
         ################################################################################
 
         # Recursive call for image reconstruction
-        nresdft = self._reconstruct_levels(coeff[1:], nlog_rad, Xrcos, Yrcos, nangle)
+        nresdft = self._reconstruct_levels(coeff[1:], nlog_rad, Xrcos, Yrcos, nangle, nsupport)
 
-        resdft = np.zeros(dims, 'complex')
-        resdft[lostart[0]:loend[0], lostart[1]:loend[1]] = nresdft * lomask
+        resdft = np.zeros(nresdft.shape[:-2] + tuple(dims), 'complex')
+        resdft[...,lostart[0]:loend[0], lostart[1]:loend[1]] = nresdft * lomask
 
         return resdft + orientdft
+
+    ############################################################################
+    ######################### DOWNSAMPLED BANDS ################################
+    ############################################################################
+
+    @staticmethod
+    def _band_box(support):
+        # Bounding box [start, end) of the non-zero frequencies in a centered
+        # spectrum, always including the zero frequency
+        box = []
+        for dim in range(2):
+            nonzero = np.nonzero(support.any(1-dim))[0]
+            center = support.shape[dim]//2
+            start = min(nonzero.min(), center) if len(nonzero) > 0 else center
+            end = max(nonzero.max(), center)+1 if len(nonzero) > 0 else center+1
+            box.append((start, end))
+        return box
+
+    def _ifft2_box(self, banddft, box):
+        # Synthesizes the band on the grid of its support box. The cropped
+        # spectrum is rolled into FFT order (frequency f at index f mod size)
+        # and scaled such that the amplitudes match the full-size band
+        (r0, r1), (c0, c1) = box
+        center = np.array(banddft.shape[-2:])//2
+        boxdft = np.roll(banddft[...,r0:r1,c0:c1], (r0-center[0], c0-center[1]), axis=(-2,-1))
+        return self.fft.ifft2(boxdft) * (boxdft.size / banddft.size)
+
+    def _fft2_box(self, band, box, shape):
+        # Adjoint of _ifft2_box, zero-pads the band spectrum to `shape`
+        (r0, r1), (c0, c1) = box
+        center = np.array(shape)//2
+        boxdft = self.fft.fft2(band) * (np.prod(shape) / np.prod(band.shape[-2:]))
+        banddft = np.zeros(band.shape[:-2] + tuple(shape), 'complex')
+        banddft[...,r0:r1,c0:c1] = np.roll(boxdft, (center[0]-r0, center[1]-c0), axis=(-2,-1))
+        return banddft
@@ -16,16 +16,39 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import itertools
+from concurrent import futures
+
 import numpy as np
 import torch
-from scipy.misc import factorial
+import torch.nn as nn
 
 import steerable.math_utils as math_utils
-pointOp = math_utils.pointOp
+from steerable.cache import FilterBankCache
+from steerable.coeffs import PyramidCoeffs, real_dtypes
+from steerable.workspace import Workspace
 
 ################################################################################
 ################################################################################
 
+# Image dtypes supported by the pyramid and the dtype of the complex-valued
+# orientation bands. There is no complex bfloat16, so the bands of bfloat16
+# pyramids are stored as complex32 (pairs of float16) as well
+complex_dtypes = {
+    torch.float64: torch.complex128,
+    torch.float32: torch.complex64,
+    torch.float16: torch.complex32,
+    torch.bfloat16: torch.complex32,
+}
+
+def compute_dtype(dtype):
+    ''' Real dtype the FFTs are computed in for images of the given dtype. The
+    FFTs do not support reduced precision on all devices and sizes, so
+    float16 and bfloat16 pyramids are computed in float32. '''
+    return torch.float64 if dtype == torch.float64 else torch.float32
+
+################################################################################
+
 
 class SCFpyr_PyTorch(object):
     '''
@@ -48,264 +71,1236 @@ class SCFpyr_PyTorch(object):
 
     '''
 
-    def __init__(self, height=5, nbands=4, scale_factor=2, device=None):
+
+    def __init__(self, height=5, nbands=4, scale_factor=2, device=None, filter_cache=None,
+                 downsample_bands=False, num_workers=1):
         self.height = height  # including low-pass and high-pass
         self.nbands = nbands  # number of orientation bands
         self.scale_factor = scale_factor
+        self.downsample_bands = downsample_bands  # crop bands to their support
+        self.num_workers = num_workers  # threads running the levels in parallel
         self.device = torch.device('cpu') if device is None else device
 
+        # Finished filter banks, keyed by input shape
+        self.filter_cache = FilterBankCache() if filter_cache is None else filter_cache
+
         # Cache constants
-        self.lutsize = 1024
-        self.Xcosn = np.pi * np.array(range(-(2*self.lutsize+1), (self.lutsize+2)))/self.lutsize
-        self.alpha = (self.Xcosn + np.pi) % (2*np.pi) - np.pi
-        self.complex_fact_construct   = np.power(np.complex(0, -1), self.nbands-1)
-        self.complex_fact_reconstruct = np.power(np.complex(0, 1), self.nbands-1)
-        
+        self.complex_fact_construct   = np.power(complex(0, -1), self.nbands-1)
+        self.complex_fact_reconstruct = np.power(complex(0, 1), self.nbands-1)
+
     ################################################################################
-    # Construction of Steerable Pyramid
+    # Filter bank
+
+    def get_filters(self, height, width, dtype=torch.float32):
+        ''' Returns the filter bank for images of size [H,W]. The masks are
+        computed once per shape and dtype and then served from
+        `self.filter_cache`.
 
-    def build(self, im_batch):
-        ''' Decomposes a batch of images into a complex steerable pyramid. 
-        The pyramid typically has ~4 levels and 4-8 orientations. 
-        
         Args:
-            im_batch (torch.Tensor): Batch of images of shape [N,C,H,W]
-        
+            height (int): image height H
+            width (int): image width W
+            dtype (torch.dtype, optional): Defaults to torch.float32. image dtype,
+                the masks are stored in this precision (see `complex_dtypes`)
+
+        All masks are stored in natural (unshifted) FFT order and the
+        complex factors of the orientation bands are folded into the band
+        masks, so the spectra never need to be shifted. The subsampling of
+        the low-pass spectrum is expressed as index gathers (`crop_rows`,
+        `crop_cols`) on the unshifted spectrum. Each level also holds the
+        support box of every orientation band, and with `downsample_bands`
+        the band masks restricted to these boxes.
+
         Returns:
-            pyramid: list containing torch.Tensor objects storing the pyramid
+            dict: low-/high-pass masks and a list with the masks and crop
+                indices for each intermediate level of the pyramid
         '''
-        
-        assert im_batch.device == self.device, 'Devices invalid (pyr = {}, batch = {})'.format(self.device, im_batch.device)
-        assert im_batch.dtype == torch.float32, 'Image batch must be torch.float32'
-        assert im_batch.dim() == 4, 'Image batch must be of shape [N,C,H,W]'
-        assert im_batch.shape[1] == 1, 'Second dimension must be 1 encoding grayscale image'
-
-        im_batch = im_batch.squeeze(1)  # flatten channels dim
-        height, width = im_batch.shape[2], im_batch.shape[1] 
-        
-        # Check whether image size is sufficient for number of levels
-        if self.height > int(np.floor(np.log2(min(width, height))) - 2):
-            raise RuntimeError('Cannot build {} levels, image too small.'.format(self.height))
-        
-        # Prepare a grid
-        log_rad, angle = math_utils.prepare_grid(height, width)
-
-        # Radial transition function (a raised cosine in log-frequency):
-        Xrcos, Yrcos = math_utils.rcosFn(1, -0.5)
-        Yrcos = np.sqrt(Yrcos)
-
-        YIrcos = np.sqrt(1 - Yrcos**2)
+        key = FilterBankCache.make_key(
+            height, width, self.height, self.nbands, self.scale_factor,
+            dtype, self.device, self.downsample_bands)
+        return self.filter_cache.get(key, lambda: self._make_filters(height, width, dtype))
 
-        lo0mask = pointOp(log_rad, YIrcos, Xrcos)
-        hi0mask = pointOp(log_rad, Yrcos, Xrcos)
+    def _make_filters(self, height, width, dtype):
+        complex_dtype = complex_dtypes[dtype]
 
-        # Note that we expand dims to support broadcasting later
-        lo0mask = torch.from_numpy(lo0mask).float()[None,:,:,None].to(self.device)
-        hi0mask = torch.from_numpy(hi0mask).float()[None,:,:,None].to(self.device)
+        # Prepare a grid, all masks are evaluated in closed form on the device
+        log_rad, angle = math_utils.prepare_grid_torch(height, width, device=self.device)
 
-        # Fourier transform (2D) and shifting
-        batch_dft = torch.rfft(im_batch, signal_ndim=2, onesided=False)
-        batch_dft = math_utils.batch_fftshift2d(batch_dft)
-
-        # Low-pass
-        lo0dft = batch_dft * lo0mask
-
-        # Start recursively building the pyramids
-        coeff = self._build_levels(lo0dft, log_rad, angle, Xrcos, Yrcos, self.height-1)
-
-        # High-pass
-        hi0dft = batch_dft * hi0mask
-        hi0 = math_utils.batch_ifftshift2d(hi0dft)
-        hi0 = torch.ifft(hi0, signal_ndim=2)
-        hi0_real = torch.unbind(hi0, -1)[0]
-        coeff.insert(0, hi0_real)
-        return coeff
-
-    def _build_levels(self, lodft, log_rad, angle, Xrcos, Yrcos, height):
-        
-        if height <= 1:
-
-            # Low-pass
-            lo0 = math_utils.batch_ifftshift2d(lodft)
-            lo0 = torch.ifft(lo0, signal_ndim=2)
-            lo0_real = torch.unbind(lo0, -1)[0]
-            coeff = [lo0_real]
-
-        else:
-            
-            Xrcos = Xrcos - np.log2(self.scale_factor)
-
-            ####################################################################
-            ####################### Orientation bandpass #######################
-            ####################################################################
-
-            himask = pointOp(log_rad, Yrcos, Xrcos)
-            himask = torch.from_numpy(himask[None,:,:,None]).float().to(self.device)
-
-            order = self.nbands - 1
-            const = np.power(2, 2*order) * np.square(factorial(order)) / (self.nbands * factorial(2*order))
-            Ycosn = 2*np.sqrt(const) * np.power(np.cos(self.Xcosn), order) * (np.abs(self.alpha) < np.pi/2) # [n,]
+        # Radial transition function (a raised cosine in log-frequency):
+        lo0mask, hi0mask = math_utils.rcos_masks(log_rad, width=1, position=-0.5)
+
+        lo0mask = math_utils.batch_ifftshift2d(lo0mask)
+        hi0mask = math_utils.batch_ifftshift2d(hi0mask).to(dtype)
+
+        # The low-pass spectrum of each level is only non-zero inside the
+        # support of the low-pass masks applied so far, see `_support_box`.
+        # The supports do not depend on the precision of the masks
+        support = lo0mask.float() != 0
+        lo0mask = lo0mask.to(dtype)
+
+        # The real-valued stages only use the half spectrum [H,W//2+1]
+        half_rows, half_cols = math_utils.hermitian_indices(height, width, self.device)
+        filters = {
+            'lo0mask': lo0mask,
+            'lo0mask_half': lo0mask[:,:width//2+1].contiguous(),
+            'hi0mask_half': hi0mask[:,:width//2+1].contiguous(),
+            'half_rows': half_rows,
+            'half_cols': half_cols,
+            'dtype': dtype,
+            'downsample_bands': self.downsample_bands,
+            'levels': []
+        }
+
+        dims = np.array([height, width])
+        for level in range(1, self.height-1):
+
+            position = -0.5 - level*np.log2(self.scale_factor)
+            _, himask = math_utils.rcos_masks(log_rad, width=1, position=position)
+
+            # Angular windows of all orientations, shape [nbands,H,W]
+            anglemasks = math_utils.angle_masks(angle, self.nbands)
+            anglemasks_recon = math_utils.angle_masks(angle, self.nbands, reconstruct=True)
+
+            # Bandpass masks of all orientations, shape [nbands,H,W]
+            bandmasks = self.complex_fact_construct * math_utils.batch_ifftshift2d(anglemasks * himask)
+            bandmasks_recon = self.complex_fact_reconstruct * math_utils.batch_ifftshift2d(anglemasks_recon * himask)
 
-            # Loop through all orientation bands
-            orientations = []
-            for b in range(self.nbands):
+            # Both are tuples of size 2
+            low_ind_start = (np.ceil((dims+0.5)/2) - np.ceil((np.ceil((dims-0.5)/2)+0.5)/2)).astype(int)
+            low_ind_end   = (low_ind_start + np.ceil((dims-0.5)/2)).astype(int)
 
-                anglemask = pointOp(angle, Ycosn, self.Xcosn + np.pi*b/self.nbands)
-                anglemask = anglemask[None,:,:,None]  # for broadcasting
-                anglemask = torch.from_numpy(anglemask).float().to(self.device)
+            # Subsampling as index gathers on the unshifted spectrum
+            crop_rows = math_utils.crop_indices(dims[0], low_ind_start[0], low_ind_end[0], self.device)
+            crop_cols = math_utils.crop_indices(dims[1], low_ind_start[1], low_ind_end[1], self.device)
 
-                # Bandpass filtering                
-                banddft = lodft * anglemask * himask
+            # Subsampling indices
+            log_rad = log_rad[low_ind_start[0]:low_ind_end[0],low_ind_start[1]:low_ind_end[1]]
+            angle = angle[low_ind_start[0]:low_ind_end[0],low_ind_start[1]:low_ind_end[1]]
+            dims = low_ind_end - low_ind_start
+
+            lomask, _ = math_utils.rcos_masks(log_rad, width=1, position=position)
+            lomask = math_utils.batch_ifftshift2d(lomask)
+
+            filter_level = {
+                'box': self._support_box(support),
+                'lomask': lomask.to(dtype),
+                'bandmasks': bandmasks.to(complex_dtype),
+                'bandmasks_recon': bandmasks_recon.to(complex_dtype),
+                'crop_rows': crop_rows,
+                'crop_cols': crop_cols,
+                'crop_blocks': math_utils.index_blocks(crop_rows, crop_cols),
+                'low_ind_start': tuple(low_ind_start.tolist()),
+                'low_ind_end': tuple(low_ind_end.tolist()),
+            }
+
+            # Each analytic band only covers half of the frequency plane, the
+            # sums of the products with the analysis masks (in the adjoint of
+            # build) are restricted to the support boxes of the bands
+            anglesupport = math_utils.batch_ifftshift2d(anglemasks) != 0
+            boxes = [math_utils.support_box(support & s) for s in anglesupport]
+            filter_level['band_boxes'] = boxes
+
+            if self.downsample_bands:
+                # So each band can be synthesized on the grid of its own box
+                filter_level['bandmasks_box'] = [
+                    math_utils.box_gather(m, box) for m, box in zip(filter_level['bandmasks'], boxes)]
+                filter_level['bandmasks_recon_box'] = [
+                    math_utils.box_gather(m, box) for m, box in zip(filter_level['bandmasks_recon'], boxes)]
+
+            filters['levels'].append(filter_level)
+
+            # Support of the low-pass spectrum at the next level
+            support = support[crop_rows][:,crop_cols] & (lomask.float() != 0)
+
+        return filters
+
+    @staticmethod
+    def _support_box(support):
+        # Bounding box of the non-zero frequencies, only worth restricting
+        # the band products to when it covers at most half of the spectrum
+        box = math_utils.support_box(support)
+        return box if box['area'] <= 0.5 else None
+
+    def plan(self, shape, dtype=torch.float32):
+        ''' Compiles the pyramid for a fixed image shape. The returned plan
+        holds the masks and crop indices for that shape, so its build and
+        reconstruct methods only perform FFTs and multiplications.
 
-                # Now multiply with complex number
-                # (x+yi)(u+vi) = (xu-yv) + (xv+yu)i
-                banddft = torch.unbind(banddft, -1)
-                banddft_real = self.complex_fact_construct.real*banddft[0] - self.complex_fact_construct.imag*banddft[1]
-                banddft_imag = self.complex_fact_construct.real*banddft[1] + self.complex_fact_construct.imag*banddft[0]
-                banddft = torch.stack((banddft_real, banddft_imag), -1)
+        Args:
+            shape (tuple): image shape [H,W], or batch shape [N,C,H,W]
+            dtype (torch.dtype, optional): Defaults to torch.float32. image dtype
 
-                band = math_utils.batch_ifftshift2d(banddft)
-                band = torch.ifft(band, signal_ndim=2)
-                orientations.append(band)
+        Returns:
+            SCFpyrPlan: plan for images of the given shape
+        '''
+        height, width = int(shape[-2]), int(shape[-1])
 
-            ####################################################################
-            ######################## Subsample lowpass #########################
-            ####################################################################
+        # Check whether image size is sufficient for number of levels
+        if self.height > int(np.floor(np.log2(min(width, height))) - 2):
+            raise RuntimeError('Cannot build {} levels, image too small.'.format(self.height))
 
-            # Don't consider batch_size and imag/real dim
-            dims = np.array(lodft.shape[1:3])  
+        return SCFpyrPlan(self.get_filters(height, width, dtype), height, width, self.nbands, self.num_workers)
 
-            # Both are tuples of size 2
-            low_ind_start = (np.ceil((dims+0.5)/2) - np.ceil((np.ceil((dims-0.5)/2)+0.5)/2)).astype(int)
-            low_ind_end   = (low_ind_start + np.ceil((dims-0.5)/2)).astype(int)
+    ################################################################################
+    # Construction of Steerable Pyramid
 
-            # Subsampling indices
-            log_rad = log_rad[low_ind_start[0]:low_ind_end[0],low_ind_start[1]:low_ind_end[1]]
-            angle = angle[low_ind_start[0]:low_ind_end[0],low_ind_start[1]:low_ind_end[1]]
+    def build(self, im_batch, levels=None, bands=None, residuals=True, max_memory_bytes=None,
+              out=None, workspace=None):
+        ''' Decomposes a batch of images into a complex steerable pyramid. 
+        The pyramid typically has ~4 levels and 4-8 orientations. 
+        
+        Args:
+            im_batch (torch.Tensor): Batch of images of shape [N,C,H,W], with
+                dtype float64, float32, float16 or bfloat16
+            levels (iterable, optional): indices of the levels to compute,
+                from 0 (finest) to height-3, defaults to all levels
+            bands (iterable, optional): indices of the orientation bands to
+                compute at these levels, defaults to all bands
+            residuals (bool, optional): Defaults to True. whether to compute
+                the high-pass and low-pass residuals
+            max_memory_bytes (int, optional): memory budget, the batch is
+                split into chunks whose estimated peak memory fits into it
+            out (list, optional): preallocated coefficients to write into,
+                see `SCFpyrPlan.empty_coeff`
+            workspace (Workspace, optional): scratch buffers reused across
+                calls of the same shape, see `steerable.workspace`
+        
+        Returns:
+            pyramid: list containing torch.Tensor objects storing the pyramid,
+                the orientation bands of each level are stacked in a single
+                complex-valued tensor of shape [N,nbands,H,W]. With
+                `downsample_bands` each level is a list of [N,h,w] tensors
+                instead, sampled on the support box of the band.
+
+        The decomposition is differentiable with respect to `im_batch`, the
+        backward pass applies the adjoint transform (see `SCFpyrBuild`).
+
+        Entries that are not computed are None: the residuals, the levels not
+        in `levels` and, if only some `bands` are selected, the other bands
+        of a level, which is then returned as list of [N,h,w] tensors. The
+        mask products and inverse FFTs of these entries are skipped, and the
+        low-pass spectrum is only subsampled as deep as needed. `reconstruct`
+        treats missing entries as zeros. Partial pyramids are differentiated
+        by autograd.
+
+        With `max_memory_bytes` the batch is processed in chunks, sized with
+        the memory estimate of `SCFpyrPlan.memory_per_example`. The budget
+        covers the coefficients of the whole batch, which are allocated
+        once, and the temporaries of one chunk.
+
+        With `out` or `workspace` all spectra and bands are computed with the
+        `out=` variants of the operators into these buffers, with the masks
+        converted to the compute dtypes once. Repeated calls of the same
+        shape then only allocate inside `torch.fft`, which computes into a
+        temporary of the output size and copies it into `out` (about half
+        of the allocations of a call without workspace). Without `out`
+        the coefficients are buffers of the workspace as well, overwritten by
+        the next call. This is not differentiable and needs the full pyramid.
+
+        The coefficients have the dtype of `im_batch`, with complex-valued
+        bands as given by `complex_dtypes`. float64 pyramids are computed in
+        double precision. For float16 and bfloat16 the masks and the
+        coefficients are stored in reduced precision, which halves their
+        memory, while the FFTs are computed in float32. For images in [0,1]
+        the maximum absolute error of the coefficients against `SCFpyr_NumPy`
+        is about 1e-5 for float64 and float32 (bounded by the interpolated
+        lookup tables of the NumPy masks), 5e-3 for float16 and 4e-2 for
+        bfloat16. The maximum reconstruction error is about 1e-14, 1e-6,
+        1e-3 and 1e-2, respectively.
+        '''
+        
+        assert im_batch.device == self.device, 'Devices invalid (pyr = {}, batch = {})'.format(self.device, im_batch.device)
+        assert im_batch.dtype in complex_dtypes, 'Image batch must be torch.float64, float32, float16 or bfloat16'
+        assert im_batch.dim() == 4, 'Image batch must be of shape [N,C,H,W]'
+        assert im_batch.shape[1] == 1, 'Second dimension must be 1 encoding grayscale image'
 
-            # Actual subsampling
-            lodft = lodft[:,low_ind_start[0]:low_ind_end[0],low_ind_start[1]:low_ind_end[1],:]
+        plan = self.plan(im_batch.shape, im_batch.dtype)
+        if max_memory_bytes is not None:
+            chunk_size = plan.max_batch_size(max_memory_bytes, im_batch.shape[0])
+            if chunk_size < im_batch.shape[0]:
+                return _build_chunked(plan, im_batch, chunk_size, levels, bands, residuals, out, workspace)
+        return plan.build(im_batch, levels, bands, residuals, out, workspace)
 
-            # Filtering
-            YIrcos = np.abs(np.sqrt(1 - Yrcos**2))
-            lomask = pointOp(log_rad, YIrcos, Xrcos)
-            lomask = torch.from_numpy(lomask[None,:,:,None]).float()
-            lomask = lomask.to(self.device)
+    def iter_build(self, im_batch, levels=None, bands=None, residuals=True):
+        ''' Decomposes a batch of images level by level. Yields the high-pass
+        residual, then the orientation bands of each level from fine to
+        coarse, and finally the low-pass residual, in the same format as
+        the entries of the list returned by `build`. Only the spectra needed
+        for the remaining levels are kept in memory, so consumers that
+        reduce each level right away never hold the full pyramid.
 
-            # Convolution in spatial domain
-            lodft = lomask * lodft
+        Unlike `build`, gradients through the generator are recorded by
+        autograd instead of using the adjoint transform.
 
-            ####################################################################
-            ####################### Recursion next level #######################
-            ####################################################################
+        Args:
+            im_batch (torch.Tensor): Batch of images of shape [N,C,H,W]
+            levels, bands, residuals: selection of the coefficients to
+                compute, see `build`
 
-            coeff = self._build_levels(lodft, log_rad, angle, Xrcos, Yrcos, height-1)
-            coeff.insert(0, orientations)
+        Returns:
+            generator: pyramid coefficients, one level at a time
+        '''
+        assert im_batch.device == self.device, 'Devices invalid (pyr = {}, batch = {})'.format(self.device, im_batch.device)
+        assert im_batch.dtype in complex_dtypes, 'Image batch must be torch.float64, float32, float16 or bfloat16'
+        assert im_batch.dim() == 4, 'Image batch must be of shape [N,C,H,W]'
+        assert im_batch.shape[1] == 1, 'Second dimension must be 1 encoding grayscale image'
 
-        return coeff
+        return self.plan(im_batch.shape, im_batch.dtype).iter_build(im_batch, levels, bands, residuals)
 
     ############################################################################
     ########################### RECONSTRUCTION #################################
     ############################################################################
 
-    def reconstruct(self, coeff):
+    def reconstruct(self, coeff, shape=None, max_memory_bytes=None, out=None, workspace=None):
+        ''' Reconstructs a batch of images [N,H,W] from pyramid coefficients
+        as returned by `build`. Entries that are None are treated as zeros,
+        the image `shape` is only needed when the high-pass residual is
+        missing. With `max_memory_bytes` the batch is reconstructed in
+        chunks into a single output, with `out` and `workspace` into
+        preallocated buffers, see `build`. '''
+
+        if isinstance(coeff, PyramidCoeffs):
+            coeff = coeff.to_list()
+
+        # Orientation bands may also be given as list of [N,H,W] tensors,
+        # downsampled bands differ in size and are kept as list
+        if not self.downsample_bands:
+            coeff = [torch.stack(c, 1) if _is_full_list(c) else c for c in coeff]
+
+        for c in coeff[1:-1]:
+            if c is not None:
+                nbands = len(c) if isinstance(c, (list, tuple)) else c.shape[1]
+                if self.nbands != nbands:
+                    raise Exception("Unmatched number of orientations")
+
+        if coeff[0] is not None:
+            shape = coeff[0].shape
+        elif shape is None:
+            raise ValueError('Image shape is required without the high-pass residual')
+
+        plan = self.plan(shape, _coeff_dtype(coeff))
+        if max_memory_bytes is not None:
+            batch_size = next(t.shape[0] for t in flatten_coeff(coeff)[0] if t is not None)
+            chunk_size = plan.max_batch_size(max_memory_bytes, batch_size, 'reconstruct')
+            if chunk_size < batch_size:
+                return _reconstruct_chunked(plan, coeff, batch_size, chunk_size, out, workspace)
+        return plan.reconstruct(coeff, out, workspace)
+
+    def reconstruct_stream(self, levels, shape, dtype=None):
+        ''' Reconstructs a batch of images from pyramid coefficients given one
+        level at a time in coarse-to-fine order: first the low-pass residual,
+        then the orientation bands of each level from the coarsest to the
+        finest, and last the high-pass residual. This is the reverse of the
+        order of `build` and `iter_build`. Only a running spectrum at the
+        resolution of the current level is kept, so peak memory is about one
+        level of the pyramid, and levels can be loaded while reconstructing
+        (e.g. `PyramidStoreReader.iter_levels(examples, coarse_to_fine=True)`).
 
-        if self.nbands != len(coeff[1]):
-            raise Exception("Unmatched number of orientations")
-
-        height, width = coeff[0].shape[2], coeff[0].shape[1] 
-        log_rad, angle = math_utils.prepare_grid(height, width)
+        Args:
+            levels (iterable): pyramid levels, coarse to fine, missing levels
+                and residuals given as None
+            shape (tuple): image shape, ending in (H,W)
+            dtype (torch.dtype, optional): real dtype of the coefficients.
+                Defaults to that of the first level present
 
-        Xrcos, Yrcos = math_utils.rcosFn(1, -0.5)
-        Yrcos  = np.sqrt(Yrcos)
-        YIrcos = np.sqrt(np.abs(1 - Yrcos**2))
+        Returns:
+            torch.Tensor: reconstructed images [N,H,W]
+        '''
+        levels = iter(levels)
+        head = []  # the plan depends on the dtype of the coefficients
+        if dtype is None:
+            for level in levels:
+                head.append(level)
+                if any(t is not None for t in (level if isinstance(level, (list, tuple)) else [level])):
+                    break
+            dtype = _coeff_dtype(head)
+        return self.plan(shape, dtype).reconstruct_stream(itertools.chain(head, levels))
 
-        lo0mask = pointOp(log_rad, YIrcos, Xrcos)
-        hi0mask = pointOp(log_rad, Yrcos, Xrcos)
+################################################################################
+################################################################################
 
-        # Note that we expand dims to support broadcasting later
-        lo0mask = torch.from_numpy(lo0mask).float()[None,:,:,None].to(self.device)
-        hi0mask = torch.from_numpy(hi0mask).float()[None,:,:,None].to(self.device)
 
-        # Start recursive reconstruction
-        tempdft = self._reconstruct_levels(coeff[1:], log_rad, Xrcos, Yrcos, angle)
+class SCFpyrPlan(object):
+    '''
+    Complex steerable pyramid compiled for a fixed image shape, similar to an
+    FFTW plan. All shape-dependent data (masks in unshifted FFT order and the
+    crop indices of each level) is precomputed, and the recursion over the
+    pyramid levels is unrolled into a flat schedule. Plans are obtained
+    through `SCFpyr_PyTorch.plan(shape)`.
+
+    The band-pass products are bandlimited: when the low-pass spectrum of a
+    level is only non-zero inside a small part of the spectrum (e.g. for
+    scale factors larger than 2), the multiplications with the band masks
+    and the accumulation during reconstruction only touch the bounding box
+    of the non-zero frequencies (see `math_utils.support_box`). The analysis
+    masks of the analytic bands only cover half of the frequency plane, so
+    in the adjoint of build (the backward pass) each band is accumulated
+    only inside its own support box, also for a scale factor of 2.
+
+    With `downsample_bands` the spectrum of each orientation band is cropped
+    to the support box of the band and transformed at that smaller size. The
+    band is then sampled on a coarser grid, scaled such that its amplitudes
+    match those of the full-resolution band.
+
+    The pyramid is a linear transform, so gradients are computed with its
+    adjoint instead of by recording the intermediate spectra. The adjoint
+    of build is the synthesis pass of reconstruct with the conjugated
+    analysis masks, and vice versa (see `SCFpyrBuild`, `SCFpyrReconstruct`).
+    The backward pass therefore only costs one extra transform, and its
+    memory does not depend on the depth of the pyramid.
+
+    With `num_workers` > 1 the levels are executed in parallel on a shared
+    thread pool: the band transforms of a level run on the workers while
+    the main thread subsamples the low-pass spectrum for the next level,
+    and during reconstruction the band spectra of all levels are computed
+    concurrently and accumulated coarse to fine. This keeps more cores busy
+    on the small levels, where intra-op threading has little work to split.
+    '''
 
-        hidft = torch.rfft(coeff[0], signal_ndim=2, onesided=False)
-        hidft = math_utils.batch_fftshift2d(hidft)
+    def __init__(self, filters, height, width, nbands, num_workers=1):
+        self.filters = filters
+        self.height = height
+        self.width = width
+        self.nbands = nbands
+        self.num_workers = num_workers
+        self.lo0mask = filters['lo0mask']
+        self.lo0mask_half = filters['lo0mask_half']
+        self.hi0mask_half = filters['hi0mask_half']
+        self.half_rows = filters['half_rows']
+        self.half_cols = filters['half_cols']
+        self.downsample_bands = filters['downsample_bands']
+        self.levels = filters['levels']
+
+        # Storage dtypes of the coefficients and dtypes of the computation
+        self.dtype = filters['dtype']
+        self.complex_dtype = complex_dtypes[self.dtype]
+        self.real_compute_dtype = compute_dtype(self.dtype)
+        self.complex_compute_dtype = complex_dtypes[self.real_compute_dtype]
+
+    def build(self, im_batch, levels=None, bands=None, residuals=True, out=None, workspace=None):
+        ''' Decomposes a batch of images of shape [N,1,H,W], see `SCFpyr_PyTorch.build`. '''
+        assert tuple(im_batch.shape[-2:]) == (self.height, self.width), \
+            'Plan expects images of size {}x{}'.format(self.height, self.width)
+        partial = levels is not None or bands is not None or not residuals
+
+        if out is not None or workspace is not None:
+            assert not partial, 'Partial pyramids cannot be built into out buffers'
+            assert not (torch.is_grad_enabled() and im_batch.requires_grad), 'out= and workspace do not support autograd'
+            workspace = Workspace() if workspace is None else workspace
+            if out is None:
+                out = self.empty_coeff(im_batch.shape[0], workspace)
+            return self._analysis_into(im_batch.squeeze(1), out, workspace)
+
+        # Partial pyramids are differentiated by autograd
+        if torch.is_grad_enabled() and im_batch.requires_grad and not partial:
+            tensors = SCFpyrBuild.apply(self, im_batch)
+            return unflatten_coeff(tensors, self.coeff_structure())
+
+        return self.analysis(im_batch.squeeze(1), levels=levels, bands=bands, residuals=residuals)
+
+    def iter_build(self, im_batch, levels=None, bands=None, residuals=True):
+        ''' Generator version of `build`, see `SCFpyr_PyTorch.iter_build`. '''
+        assert tuple(im_batch.shape[-2:]) == (self.height, self.width), \
+            'Plan expects images of size {}x{}'.format(self.height, self.width)
+        return self.iter_analysis(im_batch.squeeze(1), levels=levels, bands=bands, residuals=residuals)
+
+    def reconstruct(self, coeff, out=None, workspace=None):
+        ''' Reconstructs a batch of images [N,H,W] from the list of stacked
+        pyramid coefficients returned by `build`. '''
+        tensors, _ = flatten_coeff(coeff)
+
+        if out is not None or workspace is not None:
+            assert all(t is not None for t in tensors), 'Partial pyramids cannot be reconstructed into out buffers'
+            assert not (torch.is_grad_enabled() and any(t.requires_grad for t in tensors)), \
+                'out= and workspace do not support autograd'
+            workspace = Workspace() if workspace is None else workspace
+            if out is None:
+                out = workspace.get('out', (tensors[0].shape[0], self.height, self.width), self.dtype, self.lo0mask.device)
+            return self._synthesis_into(coeff, out, workspace)
+
+        if any(t is None for t in tensors):
+            return self.synthesis(coeff)
+        if torch.is_grad_enabled() and any(t.requires_grad for t in tensors):
+            return SCFpyrReconstruct.apply(self, *tensors)
+
+        return self.synthesis(coeff)
+
+    def reconstruct_stream(self, levels):
+        ''' Reconstructs a batch of images [N,H,W] from pyramid coefficients
+        given level by level from coarse to fine, see `stream_synthesis`.
+        The levels may be any iterable, e.g. a generator loading them from
+        disk. Gradients are recorded by autograd. '''
+        return self.stream_synthesis(levels)
+
+    def empty_coeff(self, batch_size, workspace=None):
+        ''' Uninitialized pyramid coefficients of a batch in the format of
+        `build`, e.g. as `out` buffers. Taken from `workspace` if given. '''
+        device = self.lo0mask.device
+
+        def empty(name, shape, dtype):
+            if workspace is None:
+                return torch.empty(shape, dtype=dtype, device=device)
+            return workspace.get(name, shape, dtype, device)
+
+        coeff = [empty('out_hi', (batch_size, self.height, self.width), self.dtype)]
+        for i, level in enumerate(self.levels):
+            if self.downsample_bands:
+                coeff.append([empty(('out_band', i, b), (batch_size,) + box['shape'], self.complex_dtype)
+                              for b, box in enumerate(level['band_boxes'])])
+            else:
+                shape = (batch_size, self.nbands) + tuple(level['bandmasks'].shape[-2:])
+                coeff.append(empty(('out_bands', i), shape, self.complex_dtype))
+        lo_shape = tuple(self.levels[-1]['lomask'].shape) if self.levels else (self.height, self.width)
+        coeff.append(empty('out_lo', (batch_size,) + lo_shape, self.dtype))
+        return coeff
 
-        outdft = tempdft * lo0mask + hidft * hi0mask
+    def memory_per_example(self, mode='build'):
+        ''' Estimate of the peak memory in bytes per example of `build` or
+        `reconstruct`, as tuple of the bytes of the outputs and of the
+        temporaries. The temporaries are the largest set of spectra alive at
+        the same time: the full-resolution image spectrum and the low-pass
+        and high-pass spectra in the first stage, and the low-pass spectrum,
+        the band products and the band stack of each level. The inputs of
+        the call and FFT workspaces are not counted. '''
+        assert mode in ('build', 'reconstruct'), 'Mode must be build or reconstruct'
+        real = _element_size(self.dtype)
+        real_compute = _element_size(self.real_compute_dtype)
+        storage = _element_size(self.complex_dtype)
+        compute = _element_size(self.complex_compute_dtype)
+
+        size = self.height*self.width
+        stages, bands_total = [size*real_compute + 2.5*size*compute], 0
+        for level in self.levels:
+            level_size = level['bandmasks'][0].numel()
+            if self.downsample_bands:
+                bands = sum(box['shape'][0]*box['shape'][1] for box in level['band_boxes'])
+            else:
+                bands = self.nbands*level_size
+            bands_total += bands
+            # Band products and their transforms, casts to the storage dtype
+            # and the low-pass or accumulated spectrum of the level
+            stages.append((level_size + 2*bands)*compute + bands*storage)
+
+        if mode == 'reconstruct':
+            return size*real, int(max(stages) + size*compute)
+        lo_size = self.levels[-1]['lomask'].numel() if self.levels else size
+        return int((size + lo_size)*real + bands_total*storage), int(max(stages))
+
+    def max_batch_size(self, max_memory_bytes, batch_size, mode='build'):
+        ''' Largest chunk of a batch of `batch_size` examples such that the
+        estimated memory of `build` or `reconstruct` fits into
+        `max_memory_bytes`. The outputs of the whole batch are allocated
+        once and each chunk adds its own outputs and temporaries. '''
+        outputs, temporaries = self.memory_per_example(mode)
+        chunk_size = int((max_memory_bytes - outputs*batch_size) // (outputs + temporaries))
+        if chunk_size < 1:
+            raise RuntimeError('Memory budget of {} bytes is too small for {} images of size {}x{}'.format(
+                max_memory_bytes, batch_size, self.height, self.width))
+        return min(chunk_size, batch_size)
+
+    def coeff_structure(self):
+        ''' Structure of the pyramid coefficients as used by `flatten_coeff`. '''
+        bands = self.nbands if self.downsample_bands else None
+        return [None] + [bands]*len(self.levels) + [None]
+
+    def analysis(self, im_batch, adjoint=False, levels=None, bands=None, residuals=True):
+        ''' Analysis pass of the pyramid on images [N,H,W]. With `adjoint`
+        this computes the adjoint of `synthesis` instead, which uses the
+        conjugated reconstruction masks and scales each output by the
+        ratio of its size to the image size. '''
+        if self.num_workers > 1:
+            return self._analysis_parallel(im_batch, adjoint, levels, bands, residuals)
+        return list(self.iter_analysis(im_batch, adjoint, levels, bands, residuals))
+
+    def iter_analysis(self, im_batch, adjoint=False, levels=None, bands=None, residuals=True):
+        ''' Generator version of `analysis`, yields the high-pass residual,
+        the bands of each level and the low-pass residual one at a time.
+        Spectra are released as soon as they are no longer needed, so
+        between two levels only the low-pass spectrum of the next level is
+        held, besides the coefficients kept by the consumer.
+
+        Only the levels, bands and residuals selected by `levels`, `bands`
+        and `residuals` are computed (see `SCFpyr_PyTorch.build`), the others
+        are yielded as None. The low-pass spectrum is only cropped down to
+        the deepest level that is still needed. '''
+        levels, bands, depth = self._selection(levels, bands, residuals)
+
+        # Fourier transform (2D), spectra are kept in unshifted order
+        batch_dft = torch.fft.fft2(im_batch.to(self.real_compute_dtype))
+        hi = self._highpass(batch_dft) if residuals else None
 
-        reconstruction = math_utils.batch_ifftshift2d(outdft)
-        reconstruction = torch.ifft(reconstruction, signal_ndim=2)
-        reconstruction = torch.unbind(reconstruction, -1)[0]  # real
+        # Low-pass
+        lodft = batch_dft * self.lo0mask if depth > 0 else None
+        del batch_dft
+
+        yield hi
+        del hi
+
+        for i, level in enumerate(self.levels):
+            if i not in levels:
+                yield None
+            else:
+                yield self._analysis_level(lodft, level, bands, adjoint)
+            lodft = self._subsample(lodft, level) if i+1 < depth else None
+
+        yield self._lowpass(lodft, adjoint) if residuals else None
+
+    def _analysis_parallel(self, im_batch, adjoint, levels, bands, residuals):
+        # The band transforms of each level run on the worker threads, while
+        # the main thread continues with the low-pass spectra of the next
+        # levels. The low-pass spectra are alive until their bands are done
+        levels, bands, depth = self._selection(levels, bands, residuals)
+
+        batch_dft = torch.fft.fft2(im_batch.to(self.real_compute_dtype))
+        coeff = [_submit(self.num_workers, self._highpass, batch_dft) if residuals else None]
+        lodft = batch_dft * self.lo0mask if depth > 0 else None
+        del batch_dft
+
+        for i, level in enumerate(self.levels):
+            coeff.append(_submit(self.num_workers, self._analysis_level, lodft, level, bands, adjoint)
+                         if i in levels else None)
+            lodft = self._subsample(lodft, level) if i+1 < depth else None
+
+        coeff.append(self._lowpass(lodft, adjoint) if residuals else None)
+        return [c.result() if isinstance(c, futures.Future) else c for c in coeff]
+
+    def _highpass(self, batch_dft):
+        # High-pass, real-valued so only the half spectrum is needed
+        hi0dft = batch_dft[...,:self.width//2+1] * self.hi0mask_half
+        return self._to_storage(torch.fft.irfft2(hi0dft, s=(self.height, self.width)))
+
+    def _subsample(self, lodft, level):
+        # Subsample and filter the low-pass spectrum
+        lodft = lodft.index_select(1, level['crop_rows']).index_select(2, level['crop_cols'])
+        return lodft * level['lomask']
+
+    def _lowpass(self, lodft, adjoint):
+        # Low-pass residual
+        lo = torch.fft.irfft2(lodft[...,:lodft.shape[-1]//2+1], s=lodft.shape[-2:])
+        if adjoint:
+            lo = lo * (lodft.shape[-2]*lodft.shape[-1] / (self.height*self.width))
+        return self._to_storage(lo)
+
+    def _selection(self, levels, bands, residuals):
+        # Selected levels and bands (None for all bands), and the number of
+        # low-pass spectra that need to be computed
+        nlevels = len(self.levels)
+        levels = set(range(nlevels) if levels is None else levels)
+        assert all(0 <= i < nlevels for i in levels), 'Levels must be in [0, {})'.format(nlevels)
+        if bands is not None:
+            bands = sorted(set(bands))
+            assert all(0 <= b < self.nbands for b in bands), 'Bands must be in [0, {})'.format(self.nbands)
+            if len(bands) == self.nbands:
+                bands = None
+        depth = nlevels + 1 if residuals else max(levels, default=-1) + 1
+        return levels, bands, depth
+
+    def _analysis_level(self, lodft, level, bands, adjoint):
+        # Orientation bands of a single level, all or only those in `bands`
+        scale = level['bandmasks'][0].numel() / (self.height*self.width)
+        selected = range(self.nbands) if bands is None else bands
+
+        if self.downsample_bands:
+            masks = [m.conj() for m in level['bandmasks_recon_box']] if adjoint else level['bandmasks_box']
+            out = self._analysis_bands_box(lodft, level, masks, selected, scale if adjoint else None)
+            out = [self._to_storage(band) for band in out]
+        else:
+            # Bandpass filtering of all orientations at once, [N,nbands,H,W]
+            masks = level['bandmasks_recon'].conj() if adjoint else level['bandmasks']
+            if bands is not None:
+                masks = masks[bands]
+            banddft = math_utils.box_mul(lodft[:,None], masks, level['box'])
+            out = torch.fft.ifft2(banddft)
+            del banddft
+            out = self._to_storage(out * scale if adjoint else out)
+            if bands is None:
+                return out
+            out = torch.unbind(out, 1)
+
+        # Partial levels are lists with None for the bands not computed
+        if bands is None:
+            return out
+        level_bands = [None]*self.nbands
+        for b, band in zip(selected, out):
+            level_bands[b] = band
+        return level_bands
+
+    def synthesis(self, coeff, adjoint=False):
+        ''' Synthesis pass of the pyramid, returns images [N,H,W]. With
+        `adjoint` this computes the adjoint of `analysis` instead, which
+        uses the conjugated analysis masks and scales each input by the
+        ratio of the image size to its size. '''
+        if self.num_workers > 1:
+            return self._synthesis_parallel(coeff, adjoint)
+        return self.stream_synthesis(reversed(coeff), adjoint)
+
+    def stream_synthesis(self, levels, adjoint=False):
+        ''' Synthesis pass over pyramid coefficients given coarse to fine:
+        the low-pass residual, the bands of each level from the coarsest to
+        the finest and the high-pass residual. Each level is added into an
+        accumulated spectrum at its own resolution and then dropped, so only
+        the accumulator and the current level are held in memory.
+
+        Missing coefficients (None for residuals, levels or single bands of
+        a level given as list) are treated as zeros and skipped. '''
+        levels = iter(levels)
+
+        # Low-pass residual, the accumulated spectrum is None while it is zero
+        dft = self._lowpass_spectrum(next(levels), adjoint)
+
+        # Coarse to fine, all orientations at once reduced over the band axis
+        for level in reversed(self.levels):
+            bands = next(levels)
+            orientdft = None if bands is None else self._synthesis_level(bands, level, adjoint)
+            del bands
+            dft = self._accumulate(dft, orientdft, level)
+            del orientdft
+
+        return self._synthesis_output(dft, next(levels))
+
+    def _synthesis_parallel(self, coeff, adjoint):
+        # The band spectra of all levels are computed on the worker threads,
+        # while the main thread accumulates them from coarse to fine
+        futures = [None if bands is None else _submit(self.num_workers, self._synthesis_level, bands, level, adjoint)
+                   for level, bands in zip(self.levels, coeff[1:-1])]
+        dft = self._lowpass_spectrum(coeff[-1], adjoint)
+        for level, future in zip(reversed(self.levels), reversed(futures)):
+            dft = self._accumulate(dft, None if future is None else future.result(), level)
+        return self._synthesis_output(dft, coeff[0])
+
+    def _lowpass_spectrum(self, lo, adjoint):
+        # Spectrum of the low-pass residual, None for a missing residual
+        if lo is None:
+            return None
+        dft = torch.fft.fft2(lo.to(self.lo0mask.device, self.real_compute_dtype))
+        if adjoint:
+            dft = dft * (self.height*self.width / (dft.shape[-2]*dft.shape[-1]))
+        return dft
+
+    def _accumulate(self, dft, orientdft, level):
+        # Scatter the low-pass spectrum back, adjoint of the crop in build
+        if dft is None:
+            return orientdft
+        if orientdft is None:
+            orientdft = dft.new_zeros((dft.shape[0],) + level['bandmasks'].shape[-2:])
+        rows, cols = level['crop_rows'], level['crop_cols']
+        orientdft[:,rows[:,None],cols[None,:]] += dft * level['lomask']
+        return orientdft
+
+    def _synthesis_output(self, dft, hi):
+        # The real part of the reconstruction only depends on the Hermitian
+        # part of the spectrum, so the final stage works on half spectra
+        if dft is None and hi is None:
+            raise ValueError('Cannot reconstruct from empty pyramid coefficients')
+        outdft = 0
+        if dft is not None:
+            dft = math_utils.hermitian_half(dft, self.half_rows, self.half_cols)
+            outdft = dft * self.lo0mask_half
+        if hi is not None:
+            hidft = torch.fft.rfft2(hi.to(self.lo0mask.device, self.real_compute_dtype))
+            outdft = outdft + hidft * self.hi0mask_half
+
+        reconstruction = torch.fft.irfft2(outdft, s=(self.height, self.width))
+        return reconstruction.to(self.dtype)
+
+    def _synthesis_level(self, bands, level, adjoint):
+        # Spectrum of the sum of the orientation bands of a single level,
+        # bands given as None are skipped
+        device = self.lo0mask.device
+        scale = self.height*self.width / level['bandmasks'][0].numel()
+        if isinstance(bands, (list, tuple)):
+            selected = [b for b, band in enumerate(bands) if band is not None]
+            if not selected:
+                return None
+            bands = [bands[b].to(device, self.complex_compute_dtype) for b in selected]
+        else:
+            selected = range(self.nbands)
+
+        if self.downsample_bands:
+            masks = [m.conj() for m in level['bandmasks_box']] if adjoint else level['bandmasks_recon_box']
+            return self._synthesis_bands_box(bands, level, masks, selected, scale if adjoint else None)
+
+        masks = level['bandmasks'].conj() if adjoint else level['bandmasks_recon']
+        if isinstance(bands, list):
+            if len(selected) < self.nbands:
+                masks = masks[selected]
+            bands = torch.stack(bands, 1)
+        banddft = torch.fft.fft2(bands.to(device, self.complex_compute_dtype))
+        if adjoint:
+            # The analysis masks are only non-zero inside the band boxes,
+            # up to frequencies removed by the parent low-pass mask
+            boxes = [level['band_boxes'][b] for b in selected]
+            orientdft = math_utils.bands_box_sum(banddft, masks, boxes)
+        else:
+            orientdft = math_utils.box_mul(banddft, masks, level['box'], sum_dim=1)
+        del banddft
+        return orientdft * scale if adjoint else orientdft
 
-        return reconstruction
+    ############################################################################
+    # Analysis and synthesis into preallocated buffers of a `Workspace`
+
+    def _compute_masks(self):
+        # Masks in the compute dtypes, so that the products into workspace
+        # buffers do not convert them on every call. Only banks stored in
+        # reduced precision need copies, kept with the filter bank
+        masks = self.filters.get('compute_masks')
+        if masks is None:
+            def real(m):
+                return m.to(self.real_compute_dtype)
+            def complex_(m):
+                if isinstance(m, list):  # masks on the band boxes
+                    return [complex_(x) for x in m]
+                return m.to(self.complex_compute_dtype)
+            names = ['bandmasks', 'bandmasks_recon'] + (
+                ['bandmasks_box', 'bandmasks_recon_box'] if self.downsample_bands else [])
+            masks = {name: real(self.filters[name]) for name in ['lo0mask', 'lo0mask_half', 'hi0mask_half']}
+            masks['levels'] = [dict({name: complex_(level[name]) for name in names},
+                                    lomask=real(level['lomask'])) for level in self.levels]
+            self.filters['compute_masks'] = masks
+        return masks
+
+    def _compute_buffer(self, x, workspace, name):
+        # Buffer in the compute dtype of the plan for the result stored in x,
+        # x itself when the dtypes agree
+        dtype = self.complex_compute_dtype if x.is_complex() else self.real_compute_dtype
+        return x if x.dtype == dtype else workspace.get(name, x.shape, dtype, x.device)
+
+    def _compute_input(self, x, workspace, name):
+        # Input x in the compute dtype of the plan, copied into the workspace if needed
+        device = self.lo0mask.device
+        dtype = self.complex_compute_dtype if x.is_complex() else self.real_compute_dtype
+        if x.dtype == dtype and x.device == device:
+            return x
+        return workspace.get(name, x.shape, dtype, device).copy_(x)
+
+    def _analysis_into(self, im_batch, out, workspace):
+        # Same as `analysis`, all operators write into `out` or the workspace
+        batch_size, device = im_batch.shape[0], self.lo0mask.device
+
+        def scratch(name, shape):
+            return workspace.get(name, shape, self.complex_compute_dtype, device)
+
+        def store(buffer, target):
+            if buffer is not target:
+                target.copy_(buffer)
+
+        masks = self._compute_masks()
+        x = scratch('im', im_batch.shape).copy_(im_batch)
+        batch_dft = scratch('batch_dft', x.shape)
+        torch.fft.fft2(x, out=batch_dft)
+
+        # High-pass, real-valued so only the half spectrum is needed
+        hi0dft = scratch('hi0dft', (batch_size, self.height, self.width//2+1))
+        _mul_real(hi0dft.copy_(batch_dft[...,:self.width//2+1]), masks['hi0mask_half'])
+        hi = self._compute_buffer(out[0], workspace, 'hi')
+        torch.fft.irfft2(hi0dft, s=(self.height, self.width), out=hi)
+        store(hi, out[0])
 
-    def _reconstruct_levels(self, coeff, log_rad, Xrcos, Yrcos, angle):
+        # Low-pass
+        lodft = scratch(('lodft', 0), x.shape)
+        _mul_real(lodft.copy_(batch_dft), masks['lo0mask'])
+
+        for i, (level, level_masks) in enumerate(zip(self.levels, masks['levels'])):
+            if self.downsample_bands:
+                for b, (box, mask) in enumerate(zip(level['band_boxes'], level_masks['bandmasks_box'])):
+                    banddft = scratch(('banddft', i, b), (batch_size,) + box['shape'])
+                    for (rows, cols), (box_rows, box_cols) in zip(box['blocks'], box['box_blocks']):
+                        banddft[:,box_rows,box_cols].copy_(lodft[:,rows,cols])
+                    band = self._compute_buffer(out[i+1][b], workspace, ('band', i, b))
+                    torch.fft.ifft2(banddft.mul_(mask), out=band)
+                    store(band.mul_(box['area']), out[i+1][b])
+            else:
+                # Bandpass filtering of all orientations at once, [N,nbands,H,W]
+                banddft = scratch(('banddft', i), out[i+1].shape)
+                if level['box'] is None:
+                    torch.mul(lodft[:,None], level_masks['bandmasks'], out=banddft)
+                else:
+                    banddft.zero_()
+                    for rows, cols in level['box']['blocks']:
+                        torch.mul(lodft[:,None,rows,cols], level_masks['bandmasks'][:,rows,cols], out=banddft[...,rows,cols])
+                bands = self._compute_buffer(out[i+1], workspace, ('bands', i))
+                torch.fft.ifft2(banddft, out=bands)
+                store(bands, out[i+1])
+
+            # Subsample and filter the low-pass spectrum
+            nextdft = scratch(('lodft', i+1), (batch_size,) + tuple(level['lomask'].shape))
+            for (rows, cols), (crop_rows, crop_cols) in level['crop_blocks']:
+                nextdft[:,crop_rows,crop_cols].copy_(lodft[:,rows,cols])
+            lodft = _mul_real(nextdft, level_masks['lomask'])
+
+        # Low-pass residual
+        lo = self._compute_buffer(out[-1], workspace, 'lo')
+        torch.fft.irfft2(lodft[...,:lodft.shape[-1]//2+1], s=lodft.shape[-2:], out=lo)
+        store(lo, out[-1])
+        return out
+
+    def _synthesis_into(self, coeff, out, workspace):
+        # Same as `synthesis`, all operators write into `out` or the workspace
+        device = self.lo0mask.device
+
+        def scratch(name, shape):
+            return workspace.get(name, shape, self.complex_compute_dtype, device)
+
+        # Low-pass residual
+        masks = self._compute_masks()
+        lo = scratch('lo', coeff[-1].shape).copy_(coeff[-1])
+        dft = scratch(('dft', len(self.levels)), lo.shape)
+        torch.fft.fft2(lo, out=dft)
+
+        # Coarse to fine, all orientations at once reduced over the band axis
+        for i in reversed(range(len(self.levels))):
+            level, level_masks, bands = self.levels[i], masks['levels'][i], coeff[i+1]
+            orientdft = scratch(('dft', i), (dft.shape[0],) + tuple(level['bandmasks'].shape[-2:]))
+
+            if self.downsample_bands:
+                orientdft.zero_()
+                for b, (box, mask) in enumerate(zip(level['band_boxes'], level_masks['bandmasks_recon_box'])):
+                    band = self._compute_input(bands[b], workspace, ('band', i, b))
+                    banddft = scratch(('banddft', i, b), band.shape)
+                    torch.fft.fft2(band, out=banddft)
+                    math_utils.box_scatter_add(orientdft, banddft.mul_(mask).mul_(1/box['area']), box)
+            else:
+                bands = self._compute_input(bands, workspace, ('bands', i))
+                banddft = scratch(('banddft', i), bands.shape)
+                torch.fft.fft2(bands, out=banddft)
+                if level['box'] is None:
+                    torch.sum(banddft.mul_(level_masks['bandmasks_recon']), 1, out=orientdft)
+                else:
+                    orientdft.zero_()
+                    for rows, cols in level['box']['blocks']:
+                        prod = banddft[...,rows,cols].mul_(level_masks['bandmasks_recon'][:,rows,cols])
+                        torch.sum(prod, 1, out=orientdft[...,rows,cols])
+
+            # Scatter the low-pass spectrum back, adjoint of the crop in build
+            lodft = scratch(('lodft', i+1), dft.shape)
+            _mul_real(lodft.copy_(dft), level_masks['lomask'])
+            for (rows, cols), (crop_rows, crop_cols) in level['crop_blocks']:
+                orientdft[:,rows,cols].add_(lodft[:,crop_rows,crop_cols])
+            dft = orientdft
+
+        # Half spectrum of the Hermitian part, see `math_utils.hermitian_half`
+        half = (dft.shape[0], self.height, self.width//2+1)
+        mirror_rows = scratch('mirror_rows', dft.shape)
+        mirror = scratch('mirror', half)
+        torch.index_select(dft, 1, self.half_rows, out=mirror_rows)
+        torch.index_select(mirror_rows, 2, self.half_cols, out=mirror)
+        outdft = scratch('outdft', half)
+        torch.add(dft[...,:self.width//2+1], mirror.conj_physical_(), out=outdft)
+        _mul_real(outdft.mul_(0.5), masks['lo0mask_half'])
+
+        hidft = scratch('hidft', half)
+        torch.fft.rfft2(self._compute_input(coeff[0], workspace, 'hi'), out=hidft)
+        outdft.add_(_mul_real(hidft, masks['hi0mask_half']))
+
+        reconstruction = self._compute_buffer(out, workspace, 'reconstruction')
+        torch.fft.irfft2(outdft, s=(self.height, self.width), out=reconstruction)
+        if reconstruction is not out:
+            out.copy_(reconstruction)
+        return out
+
+    def _to_storage(self, x):
+        # Coefficients are stored in the precision of the plan
+        return x.to(self.complex_dtype if x.is_complex() else self.dtype)
+
+    @staticmethod
+    def _analysis_bands_box(lodft, level, masks, selected, scale=None):
+        # Orientation bands [N,h,w] synthesized on their support boxes
+        bands = []
+        for b in selected:
+            box = level['band_boxes'][b]
+            banddft = math_utils.box_gather(lodft, box) * masks[b]
+            bands.append(torch.fft.ifft2(banddft) * (box['area'] if scale is None else scale))
+        return bands
+
+    @staticmethod
+    def _synthesis_bands_box(bands, level, masks, selected, scale=None):
+        # Sum of the band spectra, zero-padded back to the size of the level
+        size = (bands[0].shape[0],) + level['band_boxes'][0]['size']
+        orientdft = torch.zeros(size, dtype=bands[0].dtype, device=bands[0].device)
+        for band, b in zip(bands, selected):
+            box = level['band_boxes'][b]
+            banddft = torch.fft.fft2(band) * masks[b] * (1/box['area'] if scale is None else scale)
+            math_utils.box_scatter_add(orientdft, banddft, box)
+        return orientdft
 
-        if len(coeff) == 1:
-            dft = torch.rfft(coeff[0], signal_ndim=2, onesided=False)
-            dft = math_utils.batch_fftshift2d(dft)
-            return dft
+################################################################################
+################################################################################
 
-        Xrcos = Xrcos - np.log2(self.scale_factor)
+# Thread pools shared by all plans, keyed by the number of workers
+_executors = {}
+
+def _submit(num_workers, fn, *args):
+    # Runs fn on the shared pool of `num_workers` threads. The torch
+    # operators release the GIL, so the threads run in parallel. The grad
+    # mode is thread-local and passed on to the worker
+    if num_workers not in _executors:
+        _executors[num_workers] = futures.ThreadPoolExecutor(num_workers)
+    grad_enabled = torch.is_grad_enabled()
+
+    def run():
+        with torch.set_grad_enabled(grad_enabled):
+            return fn(*args)
+    return _executors[num_workers].submit(run)
+
+def _mul_real(z, mask):
+    # In-place product of complex spectra with a real mask, on the real view
+    # of the spectra so the mask is not promoted to a complex tensor
+    torch.view_as_real(z).mul_(mask.unsqueeze(-1))
+    return z
+
+def _element_size(dtype):
+    return torch.empty((), dtype=dtype).element_size()
+
+def _map_coeff(fn, coeff):
+    # Applies fn to all tensors of the coefficients, keeping missing entries
+    return [[None if band[0] is None else fn(*band) for band in zip(*c)] if isinstance(c[0], (list, tuple))
+            else (None if c[0] is None else fn(*c)) for c in zip(*coeff)]
+
+def _build_chunked(plan, im_batch, chunk_size, levels, bands, residuals, out=None, workspace=None):
+    # Builds the pyramid in chunks of the batch, written into preallocated outputs
+    batch_size = im_batch.shape[0]
+    partial = levels is not None or bands is not None or not residuals
+    if not partial and not (torch.is_grad_enabled() and im_batch.requires_grad):
+        # Each chunk is built directly into its slice of the outputs
+        out = plan.empty_coeff(batch_size) if out is None else out
+        workspace = Workspace() if workspace is None else workspace
+        for start in range(0, batch_size, chunk_size):
+            out_chunk = _map_coeff(lambda c: c[start:start+chunk_size], [out])
+            plan.build(im_batch[start:start+chunk_size], out=out_chunk, workspace=workspace)
+        return out
+
+    coeff = None
+    for start in range(0, batch_size, chunk_size):
+        chunk = plan.build(im_batch[start:start+chunk_size], levels, bands, residuals)
+        if coeff is None:
+            coeff = _map_coeff(lambda c: c.new_empty((batch_size,) + c.shape[1:]), [chunk])
+        _map_coeff(lambda out, c: out[start:start+c.shape[0]].copy_(c), [coeff, chunk])
+        del chunk
+    return coeff
+
+def _reconstruct_chunked(plan, coeff, batch_size, chunk_size, out=None, workspace=None):
+    # Reconstructs the images in chunks of the batch into a preallocated output
+    tensors, _ = flatten_coeff(coeff)
+    if all(t is not None for t in tensors) and not (torch.is_grad_enabled() and any(t.requires_grad for t in tensors)):
+        if out is None:
+            out = torch.empty((batch_size, plan.height, plan.width), dtype=plan.dtype, device=plan.lo0mask.device)
+        workspace = Workspace() if workspace is None else workspace
+        for start in range(0, batch_size, chunk_size):
+            chunk = _map_coeff(lambda c: c[start:start+chunk_size], [coeff])
+            plan.reconstruct(chunk, out=out[start:start+chunk_size], workspace=workspace)
+        return out
+
+    for start in range(0, batch_size, chunk_size):
+        chunk = _map_coeff(lambda c: c[start:start+chunk_size], [coeff])
+        reconstruction = plan.reconstruct(chunk)
+        if out is None:
+            out = reconstruction.new_empty((batch_size,) + reconstruction.shape[1:])
+        out[start:start+reconstruction.shape[0]].copy_(reconstruction)
+        del chunk, reconstruction
+    return out
+
+def _is_full_list(c):
+    # Level given as list of bands without missing entries
+    return isinstance(c, (list, tuple)) and all(band is not None for band in c)
+
+def _coeff_dtype(coeff):
+    # Real dtype of the pyramid coefficients, from the first entry present
+    for c in coeff:
+        for t in (c if isinstance(c, (list, tuple)) else [c]):
+            if t is not None:
+                return real_dtypes.get(t.dtype, t.dtype)
+    raise ValueError('Cannot reconstruct from empty pyramid coefficients')
+
+def flatten_coeff(coeff):
+    ''' Flattens the pyramid coefficients into a list of tensors. Levels
+    given as list of bands are expanded, the returned structure holds the
+    number of bands of these levels (None for tensors). '''
+    tensors, structure = [], []
+    for c in coeff:
+        if isinstance(c, (list, tuple)):
+            tensors.extend(c)
+            structure.append(len(c))
+        else:
+            tensors.append(c)
+            structure.append(None)
+    return tensors, structure
+
+def unflatten_coeff(tensors, structure):
+    ''' Inverse of `flatten_coeff`. '''
+    coeff, i = [], 0
+    for n in structure:
+        if n is None:
+            coeff.append(tensors[i])
+            i += 1
+        else:
+            coeff.append(list(tensors[i:i+n]))
+            i += n
+    return coeff
 
-        ####################################################################
-        ####################### Orientation Residue ########################
-        ####################################################################
 
-        himask = pointOp(log_rad, Yrcos, Xrcos)
-        himask = torch.from_numpy(himask[None,:,:,None]).float().to(self.device)
+class SCFpyrBuild(torch.autograd.Function):
+    '''
+    Pyramid decomposition `SCFpyrPlan.build` as autograd function. The
+    backward pass applies the adjoint transform, so only the plan and the
+    shapes of the outputs are saved for backward.
+    '''
 
-        lutsize = 1024
-        Xcosn = np.pi * np.array(range(-(2*lutsize+1), (lutsize+2)))/lutsize
-        order = self.nbands - 1
-        const = np.power(2, 2*order) * np.square(factorial(order)) / (self.nbands * factorial(2*order))
-        Ycosn = np.sqrt(const) * np.power(np.cos(Xcosn), order)
+    @staticmethod
+    def forward(ctx, plan, im_batch):
+        tensors, _ = flatten_coeff(plan.analysis(im_batch.squeeze(1)))
+        ctx.plan = plan
+        ctx.input_shape = im_batch.shape
+        ctx.output_shapes = [(t.shape, t.dtype) for t in tensors]
+        return tuple(tensors)
+
+    @staticmethod
+    def backward(ctx, *grads):
+        plan = ctx.plan
+        grads = [torch.zeros(shape, dtype=dtype, device=plan.lo0mask.device) if g is None else g
+                 for g, (shape, dtype) in zip(grads, ctx.output_shapes)]
+        grad_coeff = unflatten_coeff(grads, plan.coeff_structure())
+        grad_input = plan.synthesis(grad_coeff, adjoint=True)
+        return None, grad_input.reshape(ctx.input_shape)
+
+
+class SCFpyrReconstruct(torch.autograd.Function):
+    '''
+    Pyramid reconstruction `SCFpyrPlan.reconstruct` as autograd function.
+    The backward pass applies the adjoint transform, so only the plan is
+    saved for backward.
+    '''
 
-        orientdft = torch.zeros_like(coeff[0][0])
-        for b in range(self.nbands):
+    @staticmethod
+    def forward(ctx, plan, *tensors):
+        ctx.plan = plan
+        return plan.synthesis(unflatten_coeff(tensors, plan.coeff_structure()))
 
-            anglemask = pointOp(angle, Ycosn, Xcosn + np.pi * b/self.nbands)
-            anglemask = anglemask[None,:,:,None]  # for broadcasting
-            anglemask = torch.from_numpy(anglemask).float().to(self.device)
+    @staticmethod
+    def backward(ctx, grad_output):
+        grads, _ = flatten_coeff(ctx.plan.analysis(grad_output, adjoint=True))
+        return (None,) + tuple(grads)
 
-            banddft = torch.fft(coeff[0][b], signal_ndim=2)
-            banddft = math_utils.batch_fftshift2d(banddft)
+################################################################################
+################################################################################
 
-            banddft = banddft * anglemask * himask
-            banddft = torch.unbind(banddft, -1)
-            banddft_real = self.complex_fact_reconstruct.real*banddft[0] - self.complex_fact_reconstruct.imag*banddft[1]
-            banddft_imag = self.complex_fact_reconstruct.real*banddft[1] + self.complex_fact_reconstruct.imag*banddft[0]
-            banddft = torch.stack((banddft_real, banddft_imag), -1)
 
-            orientdft = orientdft + banddft
+class _BufferName(str):
+    ''' Name of a buffer in the filter bank of `SCFpyrModule`. '''
 
-        ####################################################################
-        ########## Lowpass component are upsampled and convoluted ##########
-        ####################################################################
-        
-        dims = np.array(coeff[0][0].shape[1:3])
-        
-        lostart = (np.ceil((dims+0.5)/2) - np.ceil((np.ceil((dims-0.5)/2)+0.5)/2)).astype(np.int32)
-        loend = lostart + np.ceil((dims-0.5)/2).astype(np.int32)
 
-        nlog_rad = log_rad[lostart[0]:loend[0], lostart[1]:loend[1]]
-        nangle = angle[lostart[0]:loend[0], lostart[1]:loend[1]]
-        YIrcos = np.sqrt(np.abs(1 - Yrcos**2))
-        lomask = pointOp(nlog_rad, YIrcos, Xrcos)
+class SCFpyrModule(nn.Module):
+    '''
+    Complex steerable pyramid as `nn.Module` for images of a fixed size. The
+    filter bank of the plan is registered as non-persistent buffers, so the
+    masks follow `.to()`, `.cuda()` and `.half()` and are replicated by
+    DataParallel and DistributedDataParallel, but are not part of the state
+    dict. `forward` decomposes a batch of images and `inverse` reconstructs
+    it, both without recomputing or transferring any masks.
+
+    The masks are deterministic, so DistributedDataParallel does not need to
+    broadcast them from rank 0 on every forward. They are excluded from its
+    buffer sync when the module itself is wrapped; for a model containing
+    the module call `ddp_ignore_filters(model)` before wrapping it, or pass
+    `broadcast_buffers=False`.
+
+    Args:
+        shape (tuple): image shape [H,W], or batch shape [N,C,H,W]
+        height (int, optional): Defaults to 5. including low-pass and high-pass
+        nbands (int, optional): Defaults to 4. number of orientation bands
+        scale_factor (int, optional): Defaults to 2. scale between levels
+        downsample_bands (bool, optional): Defaults to False. crop bands to their support
+        num_workers (int, optional): Defaults to 1. threads running the levels in parallel
+    '''
 
-        # Filtering
-        lomask = pointOp(nlog_rad, YIrcos, Xrcos)
-        lomask = torch.from_numpy(lomask[None,:,:,None])
-        lomask = lomask.float().to(self.device)
+    def __init__(self, shape, height=5, nbands=4, scale_factor=2, downsample_bands=False, num_workers=1):
+        super(SCFpyrModule, self).__init__()
+        self.height = int(shape[-2])
+        self.width = int(shape[-1])
+        self.pyr_height = height
+        self.nbands = nbands
+        self.scale_factor = scale_factor
+        self.downsample_bands = downsample_bands
+        self.num_workers = num_workers
+
+        self._set_filters(torch.float32, torch.device('cpu'))
+        self._ddp_params_and_buffers_to_ignore = [name for name, _ in self.named_buffers()]
+
+    def _set_filters(self, dtype, device):
+        # Filter bank computed once per dtype, not shared with any filter cache
+        pyr = SCFpyr_PyTorch(self.pyr_height, self.nbands, self.scale_factor,
+                             filter_cache=FilterBankCache(max_bytes=0), downsample_bands=self.downsample_bands)
+        filters = pyr.plan((self.height, self.width), dtype).filters
+        filters = self._register_filters(filters, 'filters')
+        for name, buffer in self.named_buffers():
+            self._buffers[name] = buffer.to(device)
+        self._filters = filters
+        self._dtype = dtype
+
+    def _apply(self, fn, *args, **kwargs):
+        # nn.Module only casts the real-valued buffers, and from their values
+        # rounded to the previous precision. When the dtype changes the filter
+        # bank is recomputed in the new precision, which also gives the
+        # complex masks the matching complex dtype
+        module = super(SCFpyrModule, self)._apply(fn, *args, **kwargs)
+        dtype = self.filters_lo0mask.dtype
+        if dtype != self._dtype:
+            self._set_filters(dtype, self.filters_lo0mask.device)
+        return module
+
+    def _register_filters(self, obj, name):
+        # Registers all tensors of the (nested) filter bank as buffers and
+        # returns the filter bank with the tensors replaced by buffer names
+        if isinstance(obj, torch.Tensor):
+            self.register_buffer(name, obj, persistent=False)
+            return _BufferName(name)
+        if isinstance(obj, dict):
+            return {k: self._register_filters(v, '{}_{}'.format(name, k)) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [self._register_filters(v, '{}_{}'.format(name, i)) for i, v in enumerate(obj)]
+        return obj
+
+    def _resolve_filters(self, obj):
+        if isinstance(obj, _BufferName):
+            return getattr(self, obj)
+        if isinstance(obj, dict):
+            return {k: self._resolve_filters(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [self._resolve_filters(v) for v in obj]
+        return obj
+
+    def plan(self):
+        ''' Returns the plan operating on the current buffers of the module. '''
+        filters = self._resolve_filters(self._filters)
+        return SCFpyrPlan(filters, self.height, self.width, self.nbands, self.num_workers)
+
+    def forward(self, im_batch):
+        ''' Decomposes a batch of images of shape [N,1,H,W], see `SCFpyr_PyTorch.build`. '''
+        assert im_batch.dim() == 4, 'Image batch must be of shape [N,C,H,W]'
+        assert im_batch.shape[1] == 1, 'Second dimension must be 1 encoding grayscale image'
+        return self.plan().build(im_batch)
 
-        ################################################################################
+    def inverse(self, coeff):
+        ''' Reconstructs a batch of images [N,H,W], see `SCFpyr_PyTorch.reconstruct`. '''
+        if isinstance(coeff, PyramidCoeffs):
+            coeff = coeff.to_list()
+        if not self.downsample_bands:
+            coeff = [torch.stack(c, 1) if isinstance(c, (list, tuple)) else c for c in coeff]
+        return self.plan().reconstruct(coeff)
 
-        # Recursive call for image reconstruction        
-        nresdft = self._reconstruct_levels(coeff[1:], nlog_rad, Xrcos, Yrcos, nangle)
+    def extra_repr(self):
+        return 'shape=({}, {}), nbands={}, downsample_bands={}'.format(
+            self.height, self.width, self.nbands, self.downsample_bands)
 
-        resdft = torch.zeros_like(coeff[0][0]).to(self.device)
-        resdft[:,lostart[0]:loend[0], lostart[1]:loend[1],:] = nresdft * lomask
 
-        return resdft + orientdft
+def ddp_ignore_filters(model):
+    '''
+    Excludes the filter banks of all `SCFpyrModule` submodules of `model`
+    from the buffer sync of DistributedDataParallel. Each rank computes the
+    same masks itself, so they need not be broadcast on every forward. Call
+    this before wrapping the model.
+    '''
+    from torch.nn.parallel import DistributedDataParallel
+    names = list(getattr(model, '_ddp_params_and_buffers_to_ignore', []))
+    for prefix, module in model.named_modules():
+        if isinstance(module, SCFpyrModule):
+            names += [prefix + '.' + name if prefix else name for name, _ in module.named_buffers()]
+    DistributedDataParallel._set_params_and_buffers_to_ignore_for_model(model, sorted(set(names)))
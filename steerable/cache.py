@@ -0,0 +1,355 @@
+# MIT License
+#
+# Copyright (c) 2018 Tom Runia
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to conditions.
+#
+# Author: Tom Runia
+# Date Created: 2026-10-16
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import hashlib
+import os
+import pickle
+import threading
+import warnings
+
+import numpy as np
+import torch
+
+################################################################################
+################################################################################
+
+# Files of the disk tier of `PyramidCache`, written with torch.save
+DISK_SUFFIX = '.pt'
+
+def tensor_nbytes(obj):
+    ''' Total number of bytes held by all tensors in a (nested) container. '''
+    if isinstance(obj, torch.Tensor):
+        return obj.numel() * obj.element_size()
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, dict):
+        return sum(tensor_nbytes(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(tensor_nbytes(v) for v in obj)
+    return 0
+
+
+class LRUCache(object):
+    '''
+    Least-recently-used cache with a memory cap. Entries are evicted in
+    LRU order until the total size of the cached values fits in `max_bytes`.
+    An entry that is larger than `max_bytes` by itself evicts all others
+    and is kept as the only entry, with a warning that the cap is too small.
+    A cap of 0 disables caching.
+
+    Args:
+        max_bytes (int): memory cap for all cached values together
+        sizeof (callable, optional): returns the size in bytes of a value
+    '''
+
+    def __init__(self, max_bytes, sizeof=tensor_nbytes):
+        self.max_bytes = int(max_bytes)
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()  # key => (value, nbytes)
+        self._nbytes = 0
+        self._warned = False  # about entries larger than the cap
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        # Locks cannot be pickled, and the cached values are dropped so that
+        # copies of objects holding a cache stay small
+        state = self.__dict__.copy()
+        del state['_lock'], state['_entries']
+        state['_nbytes'] = 0
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._entries = collections.OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def get(self, key, factory=None):
+        ''' Returns the value for `key`. On a miss the value is computed
+        with `factory()` and inserted, or None is returned if no factory
+        is given. '''
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+            self.misses += 1
+        if factory is None:
+            return None
+        value = factory()
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        nbytes = self.sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._nbytes -= self._entries.pop(key)[1]
+            if self.max_bytes <= 0:
+                return
+            if nbytes > self.max_bytes and not self._warned:
+                warnings.warn('Cache entry of {} bytes exceeds max_bytes={}, only the most recent '
+                              'entry is kept'.format(nbytes, self.max_bytes))
+                self._warned = True
+            self._entries[key] = (value, nbytes)
+            self._nbytes += nbytes
+            while self._nbytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted_nbytes) = self._entries.popitem(last=False)
+                self._nbytes -= evicted_nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups > 0 else 0.0,
+            'entries': len(self._entries),
+            'nbytes': self._nbytes,
+            'max_bytes': self.max_bytes,
+        }
+
+
+class FilterBankCache(LRUCache):
+    '''
+    Cache for the finished (device-resident) filter banks of the steerable
+    pyramid. Entries are keyed by (H, W, height, nbands, scale_factor,
+    dtype, device, downsample_bands), so repeated calls on the same input shape skip mask
+    generation and host-to-device transfers entirely.
+
+    Args:
+        max_bytes (int, optional): Defaults to 1GB. memory cap for all masks,
+            the bank of a 1080x1920 input with 8 bands takes about 350MB
+    '''
+
+    def __init__(self, max_bytes=1024**3):
+        super(FilterBankCache, self).__init__(max_bytes)
+
+    @staticmethod
+    def make_key(height, width, pyr_height, nbands, scale_factor, dtype, device,
+                 downsample_bands=False):
+        return (int(height), int(width), int(pyr_height), int(nbands),
+                float(scale_factor), dtype, torch.device(device), bool(downsample_bands))
+
+
+class PyramidCache(object):
+    '''
+    Content-addressed cache of computed pyramids. Entries are keyed by a hash
+    of the input images (bytes, shape and dtype) together with the pyramid
+    configuration (implementation, height, nbands, scale_factor and
+    downsample_bands), so recurring inputs are decomposed only once, across
+    epochs and, with a disk tier, across jobs.
+
+    Lookups go to an in-memory LRU first and then to an optional on-disk
+    tier, which holds one file per entry and evicts the least recently used
+    files when it grows beyond `max_disk_bytes`. The files only hold
+    tensors (written with `torch.save` and read with `weights_only`), so a
+    directory shared across jobs cannot inject arbitrary objects. Entries found on disk are
+    promoted to memory. Returned coefficients are shared with the cache and
+    must not be modified in place.
+
+    Args:
+        max_bytes (int, optional): Defaults to 1GB. memory cap of the LRU tier
+        path (str, optional): directory of the disk tier, disabled if None
+        max_disk_bytes (int, optional): Defaults to 16GB. size cap of the disk tier
+    '''
+
+    def __init__(self, max_bytes=1024**3, path=None, max_disk_bytes=16*1024**3):
+        self.memory = LRUCache(max_bytes)
+        self.path = path
+        self.max_disk_bytes = int(max_disk_bytes)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._disk = collections.OrderedDict()  # key => nbytes, in LRU order
+        self._disk_nbytes = 0
+        self._lock = threading.RLock()
+        if path is not None:
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            # Partial files left by interrupted writes
+            for f in os.listdir(path):
+                if f.endswith('.tmp'):
+                    _remove(os.path.join(path, f))
+            # Existing entries, least recently used first. The directory may
+            # be shared with other instances, which can remove files any time
+            entries = []
+            for f in os.listdir(path):
+                if f.endswith(DISK_SUFFIX):
+                    try:
+                        stat = os.stat(os.path.join(path, f))
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, f[:-len(DISK_SUFFIX)], stat.st_size))
+            for _, key, nbytes in sorted(entries):
+                self._disk[key] = nbytes
+                self._disk_nbytes += nbytes
+
+    @staticmethod
+    def make_key(pyr, im):
+        ''' Hash of the input images and the configuration of the pyramid. '''
+        # The raw bytes, also for dtypes without NumPy equivalent (bfloat16)
+        if isinstance(im, torch.Tensor):
+            data = im.detach().cpu().contiguous().reshape(-1).view(torch.uint8).numpy()
+        else:
+            data = np.ascontiguousarray(im).reshape(-1).view(np.uint8)
+        config = (type(pyr).__name__, pyr.height, pyr.nbands, float(pyr.scale_factor),
+                  bool(getattr(pyr, 'downsample_bands', False)), str(im.dtype), tuple(im.shape))
+        digest = hashlib.sha256(repr(config).encode('utf-8'))
+        digest.update(data if data.size > 0 else b'')
+        return digest.hexdigest()
+
+    def build(self, pyr, im):
+        ''' Returns `pyr.build(im)`, from the cache if the same images were
+        decomposed with the same pyramid configuration before. Inputs that
+        require gradients bypass the cache, as cached coefficients are not
+        connected to the autograd graph of the new input. '''
+        if isinstance(im, torch.Tensor) and torch.is_grad_enabled() and im.requires_grad:
+            return pyr.build(im)
+        key = self.make_key(pyr, im)
+        coeff = self.get(key)
+        if coeff is None:
+            coeff = pyr.build(im)
+            self.put(key, coeff)
+        elif isinstance(im, torch.Tensor):
+            coeff = _map_tensors(coeff, lambda t: t.to(im.device))
+        return coeff
+
+    def get(self, key):
+        coeff = self.memory.get(key)
+        with self._lock:
+            if coeff is not None:
+                self.hits += 1
+                return coeff
+            if key not in self._disk:
+                self.misses += 1
+                return None
+            self._disk.move_to_end(key)
+        filename = self._filename(key)
+        try:
+            coeff = _load_entry(filename)
+            os.utime(filename, None)  # recently used
+        except (OSError, EOFError, RuntimeError, pickle.UnpicklingError):
+            # Evicted or cleared by another instance sharing the directory
+            with self._lock:
+                if key in self._disk:
+                    self._disk_nbytes -= self._disk.pop(key)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self.disk_hits += 1
+        self.memory.put(key, coeff)
+        return coeff
+
+    def put(self, key, coeff):
+        # Cached entries never hold on to an autograd graph
+        coeff = _map_tensors(coeff, lambda t: t.detach() if t.requires_grad else t)
+        self.memory.put(key, coeff)
+        if self.path is None:
+            return
+        filename = self._filename(key)
+        _save_entry(filename + '.tmp', coeff)
+        os.replace(filename + '.tmp', filename)
+        with self._lock:
+            if key in self._disk:
+                self._disk_nbytes -= self._disk.pop(key)
+            self._disk[key] = os.path.getsize(filename)
+            self._disk_nbytes += self._disk[key]
+            while self._disk_nbytes > self.max_disk_bytes and self._disk:
+                evicted, nbytes = self._disk.popitem(last=False)
+                self._disk_nbytes -= nbytes
+                _remove(self._filename(evicted))
+
+    def _filename(self, key):
+        return os.path.join(self.path, key + DISK_SUFFIX)
+
+    def clear(self):
+        with self._lock:
+            self.memory.clear()
+            for key in self._disk:
+                _remove(self._filename(key))
+            self._disk.clear()
+            self._disk_nbytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'memory_hits': self.hits - self.disk_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups > 0 else 0.0,
+            'memory': self.memory.stats(),
+            'disk_entries': len(self._disk),
+            'disk_nbytes': self._disk_nbytes,
+        }
+
+
+def _remove(filename):
+    # Removes a file of the disk tier, which another instance may have removed already
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
+
+def _save_entry(filename, coeff):
+    # Entries hold tensors only, NumPy coefficients are converted and marked
+    is_numpy = any(isinstance(c, np.ndarray) for c in _flatten(coeff))
+    coeff = _map_tensors(coeff, lambda a: torch.from_numpy(np.ascontiguousarray(a)), np.ndarray)
+    torch.save({'numpy': is_numpy, 'coeff': _map_tensors(coeff, lambda t: t.detach().cpu())}, filename)
+
+def _load_entry(filename):
+    # The directory may be shared, so files are loaded without unpickling
+    # arbitrary objects
+    entry = torch.load(filename, weights_only=True)
+    if entry['numpy']:
+        return _map_tensors(entry['coeff'], lambda t: t.numpy())
+    return entry['coeff']
+
+def _flatten(obj):
+    if isinstance(obj, (list, tuple)):
+        return [x for v in obj for x in _flatten(v)]
+    return [obj]
+
+def _map_tensors(obj, fn, kind=torch.Tensor):
+    # Applies fn to all tensors (or arrays) in a (nested) list of coefficients
+    if isinstance(obj, kind):
+        return fn(obj)
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_map_tensors(v, fn, kind) for v in obj)
+    return obj
@@ -0,0 +1,199 @@
+# MIT License
+#
+# Copyright (c) 2018 Tom Runia
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to conditions.
+#
+# Author: Tom Runia
+# Date Created: 2026-10-16
+
+'''
+Quantization of pyramid coefficients for storage and transfer. Each band of
+each example is mapped affinely to int8 (or float16) with its own scale and
+offset, computed from the range of the band:
+
+    coeffs = PyramidCoeffs.from_list(pyr.build(im_batch))
+    encoded = codec.encode(coeffs, dtype=torch.int8)
+    decoded = encoded.decode()
+    snr = codec.reconstruction_snr(pyr, coeffs, decoded)
+
+Complex bands are either quantized as real and imaginary part ('cartesian'),
+or as amplitude and phase ('polar'), each with their own scale and offset.
+All operations work on the packed buffer of `PyramidCoeffs` at once.
+'''
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import torch
+
+from steerable.coeffs import PyramidCoeffs
+
+################################################################################
+################################################################################
+
+# Largest quantized magnitude per storage dtype
+qmax = {
+    torch.int8: 127.0,
+    torch.float16: 1.0,
+}
+
+
+def segment_ids(layout, total, mode='cartesian'):
+    ''' Segment of each value of a packed buffer row, one segment per band
+    (and per component of complex bands in 'polar' mode). The padding of
+    odd-sized segments is assigned to an extra last segment.
+
+    Returns:
+        tuple: LongTensor of shape [total], number of segments (without padding)
+    '''
+    ids = np.empty(total, np.int64)
+    segment = 0
+    for level in layout:
+        is_complex = level['kind'] != 'real'
+        for offset, shape in level['bands']:
+            size = int(np.prod(shape)) * (2 if is_complex else 1)
+            if is_complex and mode == 'polar':
+                ids[offset:offset+size:2] = segment
+                ids[offset+1:offset+size:2] = segment+1
+                segment += 2
+            else:
+                ids[offset:offset+size] = segment
+                segment += 1
+            ids[offset+size:offset+size+size%2] = -1
+    ids[ids == -1] = segment
+    return torch.from_numpy(ids), segment
+
+def _complex_pairs(layout, total):
+    # Boolean mask over the value pairs of a buffer row, true for complex bands
+    mask = np.zeros(total//2, bool)
+    for level in layout:
+        if level['kind'] != 'real':
+            for offset, shape in level['bands']:
+                mask[offset//2:offset//2+int(np.prod(shape))] = True
+    return torch.from_numpy(mask)
+
+def to_polar(coeffs):
+    ''' Replaces the (real, imag) pairs of all complex bands by (amplitude, phase). '''
+    pairs = coeffs.buffer.view(coeffs.batch_size, -1, 2)
+    polar = torch.stack([torch.hypot(pairs[...,0], pairs[...,1]), torch.atan2(pairs[...,1], pairs[...,0])], -1)
+    mask = _complex_pairs(coeffs.layout, coeffs.buffer.shape[1]).to(pairs.device)
+    return PyramidCoeffs(torch.where(mask[:,None], polar, pairs).view_as(coeffs.buffer), coeffs.layout)
+
+def from_polar(coeffs):
+    ''' Inverse of `to_polar`. '''
+    pairs = coeffs.buffer.view(coeffs.batch_size, -1, 2)
+    cartesian = torch.stack([pairs[...,0]*torch.cos(pairs[...,1]), pairs[...,0]*torch.sin(pairs[...,1])], -1)
+    mask = _complex_pairs(coeffs.layout, coeffs.buffer.shape[1]).to(pairs.device)
+    return PyramidCoeffs(torch.where(mask[:,None], cartesian, pairs).view_as(coeffs.buffer), coeffs.layout)
+
+
+class QuantizedCoeffs(object):
+    '''
+    Quantized pyramid coefficients, as returned by `encode`. The values are
+    stored in a buffer of the packed layout of `PyramidCoeffs`, together with
+    the scale and offset of every segment (see `segment_ids`) of every
+    example, such that value = data * scale + offset.
+
+    Args:
+        data (torch.Tensor): quantized buffer [N,total] of dtype int8 or float16
+        scale (torch.Tensor): scale per example and segment [N,segments+1]
+        offset (torch.Tensor): offset per example and segment [N,segments+1]
+        layout (list): layout of the buffer, see `PyramidCoeffs`
+        mode (str): 'cartesian' or 'polar'
+        dtype (torch.dtype): dtype of the decoded buffer
+    '''
+
+    def __init__(self, data, scale, offset, layout, mode, dtype):
+        self.data = data
+        self.scale = scale
+        self.offset = offset
+        self.layout = layout
+        self.mode = mode
+        self.dtype = dtype
+
+    @property
+    def nbytes(self):
+        return sum(t.numel() * t.element_size() for t in [self.data, self.scale, self.offset])
+
+    def to(self, *args, **kwargs):
+        return QuantizedCoeffs(self.data.to(*args, **kwargs), self.scale.to(*args, **kwargs),
+                               self.offset.to(*args, **kwargs), self.layout, self.mode, self.dtype)
+
+    def decode(self):
+        ''' Dequantizes the coefficients, returns `PyramidCoeffs`. '''
+        ids, _ = segment_ids(self.layout, self.data.shape[1], self.mode)
+        ids = ids.to(self.data.device)
+        buffer = self.data.to(self.scale.dtype) * self.scale[:,ids] + self.offset[:,ids]
+        coeffs = PyramidCoeffs(buffer.to(self.dtype), self.layout)
+        coeffs._zero_padding()
+        return from_polar(coeffs) if self.mode == 'polar' else coeffs
+
+
+def encode(coeffs, dtype=torch.int8, mode='cartesian'):
+    '''
+    Quantizes pyramid coefficients with a scale and offset per band and example.
+
+    Args:
+        coeffs (PyramidCoeffs or list): coefficients, as returned by `build`
+        dtype (torch.dtype, optional): Defaults to torch.int8. int8 or float16
+        mode (str, optional): Defaults to 'cartesian'. quantize complex bands
+            as real/imag ('cartesian') or amplitude/phase ('polar')
+
+    Returns:
+        QuantizedCoeffs: quantized coefficients
+    '''
+    assert dtype in qmax, 'Quantization dtype must be torch.int8 or torch.float16'
+    assert mode in ('cartesian', 'polar'), 'Mode must be cartesian or polar'
+    if not isinstance(coeffs, PyramidCoeffs):
+        coeffs = PyramidCoeffs.from_list(coeffs)
+    if mode == 'polar':
+        coeffs = to_polar(coeffs)
+
+    buffer = coeffs.buffer.float()
+    ids, num_segments = segment_ids(coeffs.layout, buffer.shape[1], mode)
+    ids = ids.to(buffer.device)[None].expand_as(buffer)
+
+    # Range of every segment of every example, in one reduction
+    shape = (buffer.shape[0], num_segments+1)
+    vmin = buffer.new_zeros(shape).scatter_reduce(1, ids, buffer, 'amin', include_self=False)
+    vmax = buffer.new_zeros(shape).scatter_reduce(1, ids, buffer, 'amax', include_self=False)
+
+    offset = (vmax + vmin) / 2
+    scale = (vmax - vmin) / (2 * qmax[dtype])
+    scale = torch.where(scale > 0, scale, torch.ones_like(scale))  # constant segments
+
+    data = (buffer - offset.gather(1, ids)) / scale.gather(1, ids)
+    if dtype == torch.int8:
+        data = torch.round(data).clamp(-qmax[dtype], qmax[dtype])
+    return QuantizedCoeffs(data.to(dtype), scale, offset, coeffs.layout, mode, coeffs.dtype)
+
+def decode(encoded):
+    ''' Dequantizes coefficients returned by `encode`, see `QuantizedCoeffs.decode`. '''
+    return encoded.decode()
+
+def reconstruction_snr(pyr, coeffs, decoded):
+    '''
+    Signal-to-noise ratio (dB) of the reconstruction from the decoded
+    coefficients, relative to the reconstruction from the original ones.
+
+    Args:
+        pyr (SCFpyr_PyTorch): pyramid used to reconstruct the images
+        coeffs (PyramidCoeffs or list): original coefficients
+        decoded (PyramidCoeffs or list): decoded coefficients
+
+    Returns:
+        torch.Tensor: SNR for each example of the batch, shape [N]
+    '''
+    reference = pyr.reconstruct(coeffs).double()
+    noise = pyr.reconstruct(decoded).double() - reference
+    signal_energy = reference.pow(2).flatten(1).sum(1)
+    noise_energy = noise.pow(2).flatten(1).sum(1)
+    return 10*torch.log10(signal_energy / noise_energy)
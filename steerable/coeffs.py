@@ -0,0 +1,227 @@
+# MIT License
+#
+# Copyright (c) 2018 Tom Runia
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to conditions.
+#
+# Author: Tom Runia
+# Date Created: 2026-10-16
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numbers
+
+import numpy as np
+import torch
+
+################################################################################
+################################################################################
+
+# Real dtype of the buffer holding the complex-valued orientation bands
+real_dtypes = {
+    torch.complex128: torch.float64,
+    torch.complex64: torch.float32,
+    torch.complex32: torch.float16,
+}
+
+
+class PyramidCoeffs(object):
+    '''
+    Pyramid coefficients of a batch packed into a single contiguous buffer of
+    shape [N,total]. Each example is one row of the buffer, holding the
+    high-pass residual, the orientation bands of all levels and the low-pass
+    residual one after another. Complex-valued bands are stored as pairs of
+    real values, and every segment starts at an even offset so bands can be
+    viewed with `torch.view_as_complex`.
+
+    Indexing returns zero-copy views into the buffer: `coeffs[level]` gives
+    a level in the format returned by `SCFpyr_PyTorch.build` (a tensor for
+    the residuals and stacked levels, a list of bands for downsampled
+    levels) and `coeffs[level, band]` a single band of shape [N,h,w].
+
+    Moving, sharing and serializing the coefficients only touches the
+    buffer, e.g. `coeffs.to(device)` is a single transfer and `torch.save`
+    writes one tensor. Linear operations (+, - with coefficients of the same
+    layout, * and / with scalars) and `map` act on the whole buffer at once.
+
+    Args:
+        buffer (torch.Tensor): real-valued buffer of shape [N,total]
+        layout (list): one entry per level, see `make_layout`
+    '''
+
+    def __init__(self, buffer, layout):
+        assert buffer.dim() == 2, 'Buffer must be of shape [N,total]'
+        self.buffer = buffer
+        self.layout = layout
+
+    @staticmethod
+    def make_layout(coeff):
+        ''' Computes the layout of the pyramid coefficients `coeff` as returned
+        by `SCFpyr_PyTorch.build`. Each level is described by its `kind`
+        ('real', 'stacked' or 'list') and the offsets and shapes of its
+        bands, in number of real values per example.
+
+        Returns:
+            tuple: layout and total number of real values per example
+        '''
+        layout, offset = [], 0
+        for level in coeff:
+            if isinstance(level, (list, tuple)):
+                kind, shapes = 'list', [tuple(band.shape[1:]) for band in level]
+            elif level.is_complex():
+                kind, shapes = 'stacked', [tuple(level.shape[2:])]*level.shape[1]
+            else:
+                kind, shapes = 'real', [tuple(level.shape[1:])]
+            bands = []
+            for shape in shapes:
+                bands.append((offset, shape))
+                size = int(np.prod(shape)) * (1 if kind == 'real' else 2)
+                offset += size + size % 2  # even offsets for view_as_complex
+            layout.append({'kind': kind, 'bands': bands})
+        return layout, offset
+
+    @classmethod
+    def from_list(cls, coeff):
+        ''' Packs the pyramid coefficients `coeff` as returned by
+        `SCFpyr_PyTorch.build` into a new buffer. The real-valued residuals
+        are stored in the real dtype of the complex bands (float16 for the
+        complex32 bands of bfloat16 pyramids). Pyramids without band levels
+        are stored in the dtype of their residuals. '''
+        layout, total = cls.make_layout(coeff)
+        bands = [band for level in coeff[1:-1] for band in (level if isinstance(level, list) else [level])]
+        dtype = real_dtypes[bands[0].dtype] if bands else coeff[0].dtype
+        buffer = torch.empty(coeff[0].shape[0], total, dtype=dtype, device=coeff[0].device)
+        coeffs = cls(buffer, layout)
+        for level, value in enumerate(coeff):
+            if layout[level]['kind'] == 'list':
+                for view, band in zip(coeffs[level], value):
+                    view.copy_(band)
+            else:
+                coeffs[level].copy_(value)
+        coeffs._zero_padding()
+        return coeffs
+
+    def _zero_padding(self):
+        # The padding of odd-sized segments is kept zero, so that whole-buffer
+        # operations see well-defined values
+        for level in self.layout:
+            for offset, shape in level['bands']:
+                size = int(np.prod(shape)) * (1 if level['kind'] == 'real' else 2)
+                if size % 2:
+                    self.buffer[:,offset+size].zero_()
+
+    def _view(self, offset, shape, is_complex):
+        size = int(np.prod(shape)) * (2 if is_complex else 1)
+        flat = self.buffer[:,offset:offset+size]
+        if is_complex:
+            return torch.view_as_complex(flat.view((self.batch_size,) + tuple(shape) + (2,)))
+        return flat.view((self.batch_size,) + tuple(shape))
+
+    def __len__(self):
+        return len(self.layout)
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            level, band = key
+            entry = self.layout[level]
+            offset, shape = entry['bands'][band]
+            return self._view(offset, shape, entry['kind'] != 'real')
+        entry = self.layout[key]
+        if entry['kind'] == 'list':
+            return [self[key,band] for band in range(len(entry['bands']))]
+        offset, shape = entry['bands'][0]
+        if entry['kind'] == 'stacked':
+            # Bands of a stacked level are adjacent and of even size
+            return self._view(offset, (len(entry['bands']),) + shape, True)
+        return self._view(offset, shape, False)
+
+    def to_list(self):
+        ''' Coefficients as list of (zero-copy) views, as returned by `build`. '''
+        return [self[level] for level in range(len(self))]
+
+    @property
+    def batch_size(self):
+        return self.buffer.shape[0]
+
+    @property
+    def dtype(self):
+        return self.buffer.dtype
+
+    @property
+    def device(self):
+        return self.buffer.device
+
+    @property
+    def nbytes(self):
+        return self.buffer.numel() * self.buffer.element_size()
+
+    ############################################################################
+    # Whole-buffer operations
+
+    def map(self, fn):
+        ''' Applies `fn` to the whole buffer, returns coefficients with the same layout. '''
+        return PyramidCoeffs(fn(self.buffer), self.layout)
+
+    def to(self, *args, **kwargs):
+        return self.map(lambda buffer: buffer.to(*args, **kwargs))
+
+    def cpu(self):
+        return self.map(lambda buffer: buffer.cpu())
+
+    def cuda(self, device=None):
+        return self.map(lambda buffer: buffer.cuda(device))
+
+    def clone(self):
+        return self.map(lambda buffer: buffer.clone())
+
+    def pin_memory(self):
+        return self.map(lambda buffer: buffer.pin_memory())
+
+    def share_memory_(self):
+        ''' Moves the buffer to shared memory, for passing to other processes. '''
+        self.buffer.share_memory_()
+        return self
+
+    def _buffer_of(self, other):
+        if isinstance(other, PyramidCoeffs):
+            assert other.layout == self.layout, 'Coefficients have different layouts'
+            return other.buffer
+        if isinstance(other, numbers.Number):
+            return other
+        return NotImplemented
+
+    def __add__(self, other):
+        other = self._buffer_of(other)
+        return NotImplemented if other is NotImplemented else self.map(lambda buffer: buffer + other)
+
+    def __sub__(self, other):
+        other = self._buffer_of(other)
+        return NotImplemented if other is NotImplemented else self.map(lambda buffer: buffer - other)
+
+    def __mul__(self, other):
+        # Only scaling is elementwise on the real representation of the bands
+        if not isinstance(other, numbers.Real):
+            return NotImplemented
+        return self.map(lambda buffer: buffer * other)
+
+    def __truediv__(self, other):
+        if not isinstance(other, numbers.Real):
+            return NotImplemented
+        return self.map(lambda buffer: buffer / other)
+
+    def __neg__(self):
+        return self.map(lambda buffer: -buffer)
+
+    __radd__ = __add__
+    __rmul__ = __mul__
+
+    def __repr__(self):
+        return 'PyramidCoeffs(levels={}, batch_size={}, dtype={}, device={})'.format(
+            len(self), self.batch_size, self.dtype, self.device)
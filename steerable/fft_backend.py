@@ -0,0 +1,217 @@
+# MIT License
+#
+# Copyright (c) 2018 Tom Runia
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to conditions.
+#
+# Author: Tom Runia
+# Date Created: 2026-10-16
+
+'''
+FFT backends of `SCFpyr_NumPy`. A backend provides the 2D transforms and
+shifts used by the pyramid with the signatures of `numpy.fft`:
+
+    numpy    numpy.fft, single-threaded (default)
+    scipy    scipy.fft, multi-threaded with `workers`
+    pyfftw   pyFFTW with cached, measured plans, multi-threaded with
+             `workers`, and FFTW wisdom loaded from and saved to a file
+
+The backend is selected by name, `get_backend('scipy', workers=8)`, or with
+the environment variables STEERABLE_FFT_BACKEND, STEERABLE_FFT_WORKERS
+(-1 for all cores) and STEERABLE_FFTW_WISDOM (wisdom file of pyfftw). When
+the package of a backend is not installed, a warning is issued and the
+numpy backend is used instead. Further backends can be added with
+`register_backend`.
+'''
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import atexit
+import os
+import pickle
+import threading
+import warnings
+
+import numpy as np
+
+################################################################################
+################################################################################
+
+DEFAULT_BACKEND = 'numpy'
+
+
+class NumPyBackend(object):
+    ''' numpy.fft, the reference backend. '''
+
+    name = 'numpy'
+
+    def __init__(self, workers=None):
+        self.workers = 1
+
+    def fft2(self, x):
+        return np.fft.fft2(x)
+
+    def ifft2(self, x):
+        return np.fft.ifft2(x)
+
+    def rfft2(self, x):
+        return np.fft.rfft2(x)
+
+    def irfft2(self, x, s):
+        return np.fft.irfft2(x, s=s)
+
+    def fftshift(self, x, axes=None):
+        return np.fft.fftshift(x, axes=axes)
+
+    def ifftshift(self, x, axes=None):
+        return np.fft.ifftshift(x, axes=axes)
+
+    def __repr__(self):
+        return '{}(workers={})'.format(type(self).__name__, self.workers)
+
+
+class SciPyBackend(NumPyBackend):
+    ''' scipy.fft, the transforms of a stack are split over `workers` threads. '''
+
+    name = 'scipy'
+
+    def __init__(self, workers=None):
+        import scipy.fft
+        self.module = scipy.fft
+        self.workers = 1 if workers is None else workers
+
+    def fft2(self, x):
+        return self.module.fft2(x, workers=self.workers)
+
+    def ifft2(self, x):
+        return self.module.ifft2(x, workers=self.workers)
+
+    def rfft2(self, x):
+        return self.module.rfft2(x, workers=self.workers)
+
+    def irfft2(self, x, s):
+        return self.module.irfft2(x, s=s, workers=self.workers)
+
+
+class PyFFTWBackend(NumPyBackend):
+    '''
+    pyFFTW through its numpy interface. The FFTW plans are kept in the
+    interface cache for `keepalive` seconds after their last use, so
+    repeated transforms of the same shape are not planned again. Plans are
+    made with `planner_effort` (FFTW_MEASURE by default, FFTW_ESTIMATE
+    plans fast but leaves nothing worth keeping in the wisdom). With a
+    `wisdom` file, the accumulated wisdom is loaded on creation and saved
+    at exit, so the measurements are reused across processes.
+    '''
+
+    name = 'pyfftw'
+
+    def __init__(self, workers=None, wisdom=None, planner_effort='FFTW_MEASURE', keepalive=600):
+        import pyfftw
+        import pyfftw.interfaces.numpy_fft
+        self.pyfftw = pyfftw
+        self.module = pyfftw.interfaces.numpy_fft
+        self.workers = os.cpu_count() if workers == -1 else (1 if workers is None else workers)
+        self.wisdom = os.environ.get('STEERABLE_FFTW_WISDOM') if wisdom is None else wisdom
+        self.planner_effort = planner_effort
+        pyfftw.interfaces.cache.enable()
+        pyfftw.interfaces.cache.set_keepalive_time(keepalive)
+        if self.wisdom is not None:
+            _register_wisdom(pyfftw, self.wisdom)
+
+    def save_wisdom(self):
+        ''' Writes the FFTW wisdom to the wisdom file. '''
+        if self.wisdom is None:
+            raise ValueError('No wisdom file given, pass `wisdom` or set STEERABLE_FFTW_WISDOM')
+        _save_wisdom(self.pyfftw, self.wisdom)
+
+    def fft2(self, x):
+        return self.module.fft2(x, threads=self.workers, planner_effort=self.planner_effort)
+
+    def ifft2(self, x):
+        return self.module.ifft2(x, threads=self.workers, planner_effort=self.planner_effort)
+
+    def rfft2(self, x):
+        return self.module.rfft2(x, threads=self.workers, planner_effort=self.planner_effort)
+
+    def irfft2(self, x, s):
+        return self.module.irfft2(x, s=s, threads=self.workers, planner_effort=self.planner_effort)
+
+
+# FFTW wisdom is process-wide, so each wisdom file is loaded once, by the
+# first backend using it, and all of them are saved by a single exit handler
+_wisdom_files = set()
+_wisdom_lock = threading.Lock()
+
+def _register_wisdom(pyfftw, path):
+    path = os.path.abspath(path)
+    with _wisdom_lock:
+        if path in _wisdom_files:
+            return
+        if not _wisdom_files:
+            atexit.register(_save_all_wisdom, pyfftw)
+        _wisdom_files.add(path)
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                pyfftw.import_wisdom(pickle.load(f))
+
+def _save_wisdom(pyfftw, path):
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(pyfftw.export_wisdom(), f)
+    os.replace(path + '.tmp', path)
+
+def _save_all_wisdom(pyfftw):
+    with _wisdom_lock:
+        for path in _wisdom_files:
+            _save_wisdom(pyfftw, path)
+
+
+# Registered backends by name
+backends = {
+    'numpy': NumPyBackend,
+    'scipy': SciPyBackend,
+    'pyfftw': PyFFTWBackend,
+}
+
+def register_backend(name, backend):
+    ''' Registers a backend class, called with the number of `workers`. '''
+    backends[name] = backend
+
+def get_backend(backend=None, workers=None):
+    '''
+    Returns an FFT backend.
+
+    Args:
+        backend (str or object, optional): name of a registered backend, or a
+            backend instance which is returned as is. Defaults to the
+            environment variable STEERABLE_FFT_BACKEND, or 'numpy'
+        workers (int, optional): number of threads, -1 for all cores.
+            Defaults to STEERABLE_FFT_WORKERS, or 1
+
+    Returns:
+        backend with the methods of `NumPyBackend`
+    '''
+    if backend is not None and not isinstance(backend, str):
+        return backend
+    if backend is None:
+        backend = os.environ.get('STEERABLE_FFT_BACKEND', DEFAULT_BACKEND)
+    if workers is None:
+        workers = os.environ.get('STEERABLE_FFT_WORKERS', '1')
+        try:
+            workers = int(workers)
+        except ValueError:
+            raise ValueError('STEERABLE_FFT_WORKERS must be an integer (-1 for all cores), got {!r}'.format(workers))
+    if backend not in backends:
+        raise ValueError('Unknown FFT backend: {} (available: {})'.format(backend, ', '.join(sorted(backends))))
+    try:
+        return backends[backend](workers=workers)
+    except ImportError as e:
+        warnings.warn('FFT backend {} is not available ({}), falling back to {}'.format(backend, e, DEFAULT_BACKEND))
+        return backends[DEFAULT_BACKEND](workers=workers)
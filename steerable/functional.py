@@ -0,0 +1,147 @@
+# MIT License
+#
+# Copyright (c) 2018 Tom Runia
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to conditions.
+#
+# Author: Tom Runia
+# Date Created: 2026-10-16
+
+'''
+Functional implementation of the complex steerable pyramid that can be
+compiled with `torch.jit.script` and `torch.compile`. The functions only
+take tensors and lists of tensors, the filter bank of a plan is unpacked
+with `build_inputs` and `reconstruct_inputs`:
+
+    plan = SCFpyr_PyTorch(height=5, nbands=4).plan(shape)
+    build = torch.jit.script(functional.build)
+    coeff = build(im_batch, *functional.build_inputs(plan.filters))
+
+There is no host-side code in these functions: the crop indices are
+precomputed and the recursion over the levels is a loop over the lists.
+Under `torch.compile` all mask products are written as real arithmetic on
+`torch.view_as_real` views, so they are fused into a few kernels (inductor
+does not generate code for complex operators). Eager execution and
+TorchScript use the native complex products, which are faster there.
+Orientation bands are always returned at full size as stacked
+[N,nbands,H,W] tensors.
+'''
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from typing import List
+
+import torch
+
+################################################################################
+################################################################################
+
+@torch.jit.unused
+def _is_compiling():
+    # type: () -> bool
+    compiler = getattr(torch, 'compiler', None)
+    return compiler is not None and compiler.is_compiling()
+
+def mul_real(x, mask):
+    # type: (torch.Tensor, torch.Tensor) -> torch.Tensor
+    ''' Product of the complex tensor x and the real-valued mask. '''
+    if torch.jit.is_scripting() or not _is_compiling():
+        return x * mask
+    return torch.view_as_complex(torch.view_as_real(x) * mask.unsqueeze(-1))
+
+def mul_complex(x, y):
+    # type: (torch.Tensor, torch.Tensor) -> torch.Tensor
+    ''' Product of the complex tensors x and y. '''
+    if torch.jit.is_scripting() or not _is_compiling():
+        return x * y
+    x = torch.view_as_real(x)
+    y = torch.view_as_real(y)
+    real = x[...,0]*y[...,0] - x[...,1]*y[...,1]
+    imag = x[...,0]*y[...,1] + x[...,1]*y[...,0]
+    return torch.view_as_complex(torch.stack([real, imag], -1))
+
+def build(im_batch, lo0mask, hi0mask_half, bandmasks, lomasks, crop_rows, crop_cols):
+    # type: (torch.Tensor, torch.Tensor, torch.Tensor, List[torch.Tensor], List[torch.Tensor], List[torch.Tensor], List[torch.Tensor]) -> List[torch.Tensor]
+    ''' Decomposes a batch of images [N,1,H,W], see `SCFpyr_PyTorch.build`. '''
+    im_batch = im_batch.squeeze(1)
+    height, width = im_batch.shape[-2], im_batch.shape[-1]
+    batch_dft = torch.fft.fft2(im_batch)
+
+    # High-pass, real-valued so only the half spectrum is needed
+    hi0dft = mul_real(batch_dft[...,:width//2+1], hi0mask_half)
+    coeff = [torch.fft.irfft2(hi0dft, s=[height, width])]
+
+    # Low-pass
+    lodft = mul_real(batch_dft, lo0mask)
+
+    for i in range(len(bandmasks)):
+
+        # Bandpass filtering of all orientations at once, [N,nbands,H,W]
+        banddft = mul_complex(lodft.unsqueeze(1), bandmasks[i])
+        coeff.append(torch.fft.ifft2(banddft))
+
+        # Subsample and filter the low-pass spectrum
+        lodft = lodft.index_select(1, crop_rows[i]).index_select(2, crop_cols[i])
+        lodft = mul_real(lodft, lomasks[i])
+
+    # Low-pass residual
+    height, width = lodft.shape[-2], lodft.shape[-1]
+    coeff.append(torch.fft.irfft2(lodft[...,:width//2+1], s=[height, width]))
+    return coeff
+
+def reconstruct(coeff, lo0mask_half, hi0mask_half, half_rows, half_cols,
+                bandmasks_recon, lomasks, crop_rows, crop_cols):
+    # type: (List[torch.Tensor], torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor, List[torch.Tensor], List[torch.Tensor], List[torch.Tensor], List[torch.Tensor]) -> torch.Tensor
+    ''' Reconstructs a batch of images [N,H,W], see `SCFpyr_PyTorch.reconstruct`. '''
+    height, width = coeff[0].shape[-2], coeff[0].shape[-1]
+
+    # Low-pass residual
+    dft = torch.fft.fft2(coeff[-1])
+
+    # Coarse to fine, all orientations at once reduced over the band axis
+    nlevels = len(bandmasks_recon)
+    for j in range(nlevels):
+        i = nlevels - 1 - j
+        banddft = torch.fft.fft2(coeff[i+1])
+        orientdft = mul_complex(banddft, bandmasks_recon[i]).sum(1)
+
+        # Scatter the low-pass spectrum back, adjoint of the crop in build
+        rows, cols = crop_rows[i].unsqueeze(1), crop_cols[i].unsqueeze(0)
+        orientdft[:,rows,cols] += mul_real(dft, lomasks[i])
+        dft = orientdft
+
+    # Half spectrum of the Hermitian part, see `math_utils.hermitian_half`
+    mirror = dft[:,half_rows.unsqueeze(1),half_cols.unsqueeze(0)]
+    dft = 0.5*(dft[...,:width//2+1] + mirror.conj())
+
+    hidft = torch.fft.rfft2(coeff[0])
+    outdft = mul_real(dft, lo0mask_half) + mul_real(hidft, hi0mask_half)
+    return torch.fft.irfft2(outdft, s=[height, width])
+
+################################################################################
+
+def build_inputs(filters):
+    ''' Filter bank arguments of `build`, from the filters of a plan. '''
+    levels = filters['levels']
+    return (filters['lo0mask'], filters['hi0mask_half'],
+            [level['bandmasks'] for level in levels],
+            [level['lomask'] for level in levels],
+            [level['crop_rows'] for level in levels],
+            [level['crop_cols'] for level in levels])
+
+def reconstruct_inputs(filters):
+    ''' Filter bank arguments of `reconstruct`, from the filters of a plan. '''
+    levels = filters['levels']
+    return (filters['lo0mask_half'], filters['hi0mask_half'],
+            filters['half_rows'], filters['half_cols'],
+            [level['bandmasks_recon'] for level in levels],
+            [level['lomask'] for level in levels],
+            [level['crop_rows'] for level in levels],
+            [level['crop_cols'] for level in levels])
@@ -16,6 +16,8 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import math
+
 import numpy as np
 import torch
 
@@ -30,21 +32,140 @@ def roll_n(X, axis, n):
     return torch.cat([back, front], axis)
 
 def batch_fftshift2d(x):
-    real, imag = torch.unbind(x, -1)
-    for dim in range(1, len(real.size())):
-        n_shift = real.size(dim)//2
-        if real.size(dim) % 2 != 0:
-            n_shift += 1  # for odd-sized images
-        real = roll_n(real, axis=dim, n=n_shift)
-        imag = roll_n(imag, axis=dim, n=n_shift)
-    return torch.stack((real, imag), -1)  # last dim=2 (real&imag)
+    # Shift the zero-frequency component of a complex [N,H,W] spectrum to the center
+    return torch.fft.fftshift(x, dim=(-2,-1))
 
 def batch_ifftshift2d(x):
-    real, imag = torch.unbind(x, -1)
-    for dim in range(len(real.size()) - 1, 0, -1):
-        real = roll_n(real, axis=dim, n=real.size(dim)//2)
-        imag = roll_n(imag, axis=dim, n=imag.size(dim)//2)
-    return torch.stack((real, imag), -1)  # last dim=2 (real&imag)
+    return torch.fft.ifftshift(x, dim=(-2,-1))
+
+def crop_indices(n, start, end, device=None):
+    '''
+    Indices that select the centered frequencies [start,end) of an fftshift-ed
+    spectrum of length n directly from the unshifted spectrum. The result is
+    again in unshifted order, i.e. for an unshifted spectrum x:
+
+        x[crop_indices(n, start, end)] == ifftshift(fftshift(x)[start:end])
+    '''
+    m = end - start
+    k = torch.arange(m, device=device)
+    return (start + (k + m//2) % m - n//2) % n
+
+def index_blocks(rows, cols):
+    '''
+    Rectangular blocks of the gather x[rows][:,cols] for indices that consist
+    of a few contiguous runs, such as those of `crop_indices`. Returns pairs
+    of (row slice, column slice) into x and into the gathered result, so the
+    gather and its adjoint can be written as copies of views.
+    '''
+    def runs(indices):
+        indices = indices.tolist()
+        starts = [k for k in range(len(indices)) if k == 0 or indices[k] != indices[k-1]+1]
+        ends = starts[1:] + [len(indices)]
+        return [(slice(indices[s], indices[e-1]+1), slice(s, e)) for s, e in zip(starts, ends)]
+    return [((r, c), (rr, cc)) for r, rr in runs(rows) for c, cc in runs(cols)]
+
+def hermitian_indices(m, n, device=None):
+    ''' Row and column indices of the mirrored frequencies (-k mod m, -l mod n)
+    for the half spectrum [m,n//2+1] of an unshifted [m,n] spectrum. '''
+    rows = (-torch.arange(m, device=device)) % m
+    cols = (-torch.arange(n//2+1, device=device)) % n
+    return rows, cols
+
+def hermitian_half(x, rows, cols):
+    '''
+    Half spectrum [...,m,n//2+1] of the Hermitian part of a full unshifted
+    spectrum x [...,m,n], using the indices from `hermitian_indices`. For
+    any x, irfft2 of the result equals the real part of ifft2(x).
+    '''
+    mirror = x[...,rows[:,None],cols[None,:]]
+    return 0.5*(x[...,:cols.shape[0]] + mirror.conj())
+
+def hermitian_half_numpy(x):
+    ''' NumPy version of `hermitian_half` for unshifted spectra [...,m,n]. '''
+    m, n = x.shape[-2:]
+    mirror = x[...,((-np.arange(m)) % m)[:,None],((-np.arange(n//2+1)) % n)[None,:]]
+    return 0.5*(x[...,:n//2+1] + np.conj(mirror))
+
+def _support_interval(nonzero):
+    # Signed frequency range [fmin,fmax] of the non-zero entries along one
+    # axis of an unshifted spectrum, always including the DC component
+    n = nonzero.shape[0]
+    idx = torch.nonzero(nonzero).flatten().tolist()
+    freqs = [i if i < (n+1)//2 else i - n for i in idx] + [0]
+    return min(freqs), max(freqs)
+
+def support_box(support):
+    '''
+    Bounding box of the non-zero region of an unshifted spectrum. Because the
+    spectrum is unshifted, the box wraps around the borders and consists of
+    up to four rectangular blocks of the full spectrum. Gathering the box
+    with its `rows` and `cols` yields the (unshifted) spectrum of size
+    `shape`, from which the band can be synthesized at a lower resolution.
+
+    Args:
+        support (torch.Tensor): boolean support of shape [H,W]
+
+    Returns:
+        dict: full spectrum `size`, box `shape`, gather indices `rows` and
+            `cols`, the `blocks` as pairs of (row slice, column slice) into
+            the full spectrum and the matching `box_blocks` into the box,
+            and the `area` fraction of the box
+    '''
+    box = {'size': tuple(support.shape)}
+    slices, box_slices = [], []
+    for dim, name in enumerate(['rows', 'cols']):
+        n = support.shape[dim]
+        fmin, fmax = _support_interval(support.any(1-dim))
+        indices = list(range(0, fmax+1)) + list(range(n+fmin, n))
+        slices.append([slice(0, fmax+1)] + ([slice(n+fmin, n)] if fmin < 0 else []))
+        box_slices.append([slice(0, fmax+1)] + ([slice(fmax+1, fmax+1-fmin)] if fmin < 0 else []))
+        box[name] = torch.tensor(indices, dtype=torch.long, device=support.device)
+    box['shape'] = (box['rows'].shape[0], box['cols'].shape[0])
+    box['blocks'] = [(rows, cols) for rows in slices[0] for cols in slices[1]]
+    box['box_blocks'] = [(rows, cols) for rows in box_slices[0] for cols in box_slices[1]]
+    box['area'] = box['shape'][0]*box['shape'][1] / (support.shape[0]*support.shape[1])
+    return box
+
+def box_gather(x, box):
+    ''' Extracts the box [...,h,w] from the unshifted spectra x [...,H,W]. '''
+    return x.index_select(-2, box['rows']).index_select(-1, box['cols'])
+
+def box_scatter_add(out, x, box):
+    ''' Adds the box spectra x [...,h,w] to the full spectra out [...,H,W]. '''
+    for (rows, cols), (box_rows, box_cols) in zip(box['blocks'], box['box_blocks']):
+        out[...,rows,cols] += x[...,box_rows,box_cols]
+    return out
+
+def box_mul(x, y, box, sum_dim=None):
+    '''
+    Computes x*y, optionally reduced over `sum_dim`, only inside the box from
+    `support_box` and zero elsewhere. Without a box, this is just x*y.
+    '''
+    if box is None:
+        out = x * y
+        return out if sum_dim is None else out.sum(sum_dim)
+    shape = list(torch.broadcast_shapes(x.shape, y.shape))
+    if sum_dim is not None:
+        del shape[sum_dim]
+    out = torch.zeros(shape, dtype=torch.result_type(x, y), device=x.device)
+    for rows, cols in box['blocks']:
+        prod = x[...,rows,cols] * y[...,rows,cols]
+        out[...,rows,cols] = prod if sum_dim is None else prod.sum(sum_dim)
+    return out
+
+def bands_box_sum(x, masks, boxes):
+    '''
+    Computes (x*masks).sum(1) for the spectra x [N,nbands,H,W] of the
+    orientation bands, where each band only contributes inside its own box
+    from `support_box`. Only the boxes of x are read, so this is faster than
+    the full products when the boxes cover part of the spectrum.
+    '''
+    shape = (x.shape[0],) + tuple(x.shape[2:])
+    out = torch.zeros(shape, dtype=torch.result_type(x, masks), device=x.device)
+    for b, box in enumerate(boxes):
+        for rows, cols in box['blocks']:
+            out[...,rows,cols] += x[:,b,rows,cols] * masks[b,rows,cols]
+    return out
 
 ################################################################################
 ################################################################################
@@ -72,8 +193,64 @@ def pointOp(im, Y, X):
     out = np.interp(im.flatten(), X, Y)
     return np.reshape(out, im.shape)
 
+################################################################################
+# Closed-form mask generation in PyTorch (device-side equivalent of pointOp)
+
+def _linspace_torch(start, stop, num, device):
+    # Same arithmetic as np.linspace so that the grids agree bit-for-bit
+    step = (stop - start) / (num - 1)
+    out = torch.arange(num, dtype=torch.float64, device=device) * step + start
+    out[-1] = stop
+    return out
+
+def prepare_grid_torch(m, n, device=None, dtype=torch.float64):
+    ''' PyTorch version of `prepare_grid`, evaluated directly on `device`. '''
+    x = _linspace_torch(-(m // 2)/(m / 2), (m // 2)/(m / 2) - (1 - m % 2)*2/m, m, device)
+    y = _linspace_torch(-(n // 2)/(n / 2), (n // 2)/(n / 2) - (1 - n % 2)*2/n, n, device)
+    yv, xv = torch.meshgrid(x, y, indexing='ij')
+    angle = torch.atan2(yv, xv)
+    rad = torch.sqrt(xv**2 + yv**2)
+    rad[m//2, n//2] = rad[m//2, n//2 - 1]
+    log_rad = torch.log2(rad)
+    return log_rad.to(dtype), angle.to(dtype)
+
+def rcos_masks(log_rad, width=1, position=-0.5):
+    '''
+    Evaluates the raised-cosine transition of `rcosFn` in closed form, i.e.
+    the same as `pointOp(log_rad, sqrt(Y), X)` for the high-pass and
+    `pointOp(log_rad, sqrt(1-Y), X)` for the low-pass but without lookup
+    table interpolation.
+
+    Returns:
+        tuple: (lomask, himask) with the same shape as log_rad
+    '''
+    phase = (log_rad - position) * (math.pi/(2*width)) - math.pi/4
+    phase = torch.clamp(phase, -math.pi/2, 0)
+    return -torch.sin(phase), torch.cos(phase)
+
+def angle_masks(angle, nbands, reconstruct=False):
+    '''
+    Evaluates the angular windows of all orientation bands in closed form.
+    For construction the window is 2*sqrt(c)*cos(t)^(nbands-1) restricted to
+    half of the plane, for reconstruction it is sqrt(c)*cos(t)^(nbands-1).
+
+    Returns:
+        torch.Tensor: masks of shape [nbands,H,W]
+    '''
+    order = nbands - 1
+    const = (2**(2*order)) * (math.factorial(order)**2) / (nbands * math.factorial(2*order))
+    offsets = math.pi * torch.arange(nbands, dtype=angle.dtype, device=angle.device) / nbands
+    theta = angle[None,:,:] - offsets[:,None,None]
+    masks = torch.cos(theta)**order
+    if reconstruct:
+        return math.sqrt(const) * masks
+    alpha = torch.remainder(theta + math.pi, 2*math.pi) - math.pi
+    return 2*math.sqrt(const) * masks * (torch.abs(alpha) < math.pi/2).to(angle.dtype)
+
 def getlist(coeff):
-    straight = [bands for scale in coeff[1:-1] for bands in scale]
+    # Stacked orientation bands [N,nbands,H,W] are split along the band axis
+    straight = [bands for scale in coeff[1:-1] for bands in (
+        torch.unbind(scale, 1) if isinstance(scale, torch.Tensor) else scale)]
     straight = [coeff[0]] + straight + [coeff[-1]]
     return straight
 
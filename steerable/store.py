@@ -0,0 +1,216 @@
+# MIT License
+#
+# Copyright (c) 2018 Tom Runia
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to conditions.
+#
+# Author: Tom Runia
+# Date Created: 2026-10-16
+
+'''
+On-disk store of pyramid coefficients. A store is a directory with two files:
+
+    coeffs.bin   raw buffer of shape [count,total], one row per example in
+                 the packed layout of `PyramidCoeffs`
+    index.json   layout of a row, dtype, number of examples and metadata
+
+The buffer is memory-mapped by the reader, so any example, level or band is
+loaded lazily as a zero-copy view without reading the rest of the store.
+'''
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import numbers
+import os
+
+import numpy as np
+import torch
+
+from steerable.coeffs import PyramidCoeffs
+
+################################################################################
+################################################################################
+
+DATA_FILE = 'coeffs.bin'
+INDEX_FILE = 'index.json'
+VERSION = 1
+
+
+def _layout_to_json(layout):
+    return [{'kind': level['kind'], 'bands': [[offset, list(shape)] for offset, shape in level['bands']]}
+            for level in layout]
+
+def _layout_from_json(layout):
+    return [{'kind': level['kind'], 'bands': [(offset, tuple(shape)) for offset, shape in level['bands']]}
+            for level in layout]
+
+
+class PyramidStoreWriter(object):
+    '''
+    Writes pyramid coefficients to a store, appending one batch at a time.
+    The index is rewritten after every batch, so the store can be read
+    while it is being written. Opening an existing store appends to it,
+    after discarding data of a batch whose append was interrupted.
+
+    Args:
+        path (str): directory of the store
+        metadata (dict, optional): JSON-serializable description of the
+            pyramid (e.g. height, nbands), stored in the index
+    '''
+
+    def __init__(self, path, metadata=None):
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        index_file = os.path.join(path, INDEX_FILE)
+        if os.path.isfile(index_file):
+            with open(index_file) as f:
+                self.index = json.load(f)
+            self.layout = _layout_from_json(self.index['layout'])
+            if metadata is not None and metadata != self.index['metadata']:
+                raise ValueError('Metadata does not match existing store: {}'.format(path))
+        else:
+            self.index = {'version': VERSION, 'count': 0, 'metadata': metadata}
+            self.layout = None
+        # Bytes beyond the indexed examples are left by an append that was
+        # interrupted before the index was updated, and are dropped
+        data_file = os.path.join(path, DATA_FILE)
+        nbytes = 0
+        if self.index['count'] > 0:
+            nbytes = self.index['count'] * self.index['total'] * np.dtype(self.index['dtype']).itemsize
+        size = os.path.getsize(data_file) if os.path.isfile(data_file) else 0
+        if size < nbytes:
+            raise ValueError('Data file of store is shorter than its index ({} < {} bytes): {}'.format(size, nbytes, path))
+        self._file = open(data_file, 'ab')
+        if size > nbytes:
+            self._file.truncate(nbytes)
+
+    def __len__(self):
+        return self.index['count']
+
+    def append(self, coeff):
+        ''' Appends a batch of coefficients, as returned by `build` or as
+        `PyramidCoeffs`. Returns the index of the first appended example. '''
+        if not isinstance(coeff, PyramidCoeffs):
+            coeff = PyramidCoeffs.from_list(coeff)
+        if self.layout is None:
+            self.layout = coeff.layout
+            self.index['layout'] = _layout_to_json(coeff.layout)
+            self.index['total'] = coeff.buffer.shape[1]
+            self.index['dtype'] = str(coeff.dtype).replace('torch.', '')
+        elif coeff.layout != self.layout or str(coeff.dtype).replace('torch.', '') != self.index['dtype']:
+            raise ValueError('Coefficients do not match the layout of the store')
+
+        start = self.index['count']
+        self._file.write(coeff.buffer.detach().cpu().contiguous().numpy().tobytes())
+        self._file.flush()
+        self.index['count'] += coeff.batch_size
+        self._write_index()
+        return start
+
+    def _write_index(self):
+        # Replace the index atomically, readers never see a partial file
+        index_file = os.path.join(self.path, INDEX_FILE)
+        with open(index_file + '.tmp', 'w') as f:
+            json.dump(self.index, f)
+        os.replace(index_file + '.tmp', index_file)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class PyramidStoreReader(object):
+    '''
+    Reads pyramid coefficients from a store by memory-mapping its buffer.
+    All accessors return views into the mapping, the data is only read
+    from disk when it is used. The mapping is opened copy-on-write (mode
+    'c'), so the views can be wrapped as torch tensors, while writes to
+    them never reach the file.
+
+    Args:
+        path (str): directory of the store
+    '''
+
+    def __init__(self, path):
+        index_file = os.path.join(path, INDEX_FILE)
+        if not os.path.isfile(index_file):
+            raise FileNotFoundError('Pyramid store not found on disk: {}'.format(path))
+        with open(index_file) as f:
+            self.index = json.load(f)
+        self.path = path
+        self.layout = _layout_from_json(self.index['layout'])
+        self.metadata = self.index['metadata']
+        self.data = np.memmap(os.path.join(path, DATA_FILE), dtype=self.index['dtype'], mode='c',
+                              shape=(self.index['count'], self.index['total']))
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def coeffs(self, examples):
+        ''' Coefficients of the given examples as `PyramidCoeffs`. A slice of
+        examples is a zero-copy view, other indices are gathered. '''
+        if isinstance(examples, numbers.Integral):
+            example = int(examples) + (len(self) if examples < 0 else 0)
+            if not 0 <= example < len(self):
+                raise IndexError('Example {} out of range for store of size {}'.format(int(examples), len(self)))
+            examples = slice(example, example+1)
+        return PyramidCoeffs(torch.from_numpy(self.data[examples]), self.layout)
+
+    def iter_levels(self, examples, coarse_to_fine=False):
+        ''' Levels of the given examples one at a time, in the order of
+        `build` or, with `coarse_to_fine`, in the order consumed by
+        `SCFpyr_PyTorch.reconstruct_stream`. Each level is a view into the
+        mapping, read from disk only when it is used. '''
+        coeffs = self.coeffs(examples)
+        levels = range(len(coeffs))
+        for level in (reversed(levels) if coarse_to_fine else levels):
+            yield coeffs[level]
+
+    def __getitem__(self, key):
+        ''' Band of a single example by (example, level, band), or a whole
+        level by (example, level), as torch tensor without the batch axis.
+        Indexing with examples only returns `PyramidCoeffs`. '''
+        if not isinstance(key, tuple):
+            return self.coeffs(key)
+        example, key = key[0], key[1:]
+        coeff = self.coeffs(example)[key if len(key) > 1 else key[0]]
+        if isinstance(coeff, list):
+            return [band[0] for band in coeff]
+        return coeff[0]
+
+    def numpy(self, example, level, band=None):
+        ''' Like indexing with (example, level, band), but returns zero-copy
+        NumPy arrays. Complex bands of float16 stores are returned as real
+        arrays with a trailing axis of size 2, as NumPy has no complex32. '''
+        entry = self.layout[level]
+        bands = range(len(entry['bands'])) if band is None else [band]
+        arrays = []
+        for b in bands:
+            offset, shape = entry['bands'][b]
+            is_complex = entry['kind'] != 'real'
+            size = int(np.prod(shape)) * (2 if is_complex else 1)
+            array = self.data[example,offset:offset+size]
+            if is_complex and array.dtype == np.float16:
+                array = array.reshape(tuple(shape) + (2,))
+            elif is_complex:
+                array = array.view(np.complex128 if array.dtype == np.float64 else np.complex64).reshape(shape)
+            else:
+                array = array.reshape(shape)
+            arrays.append(array)
+        if band is not None or entry['kind'] == 'real':
+            return arrays[0]
+        return arrays
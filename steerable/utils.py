@@ -24,6 +24,8 @@ import matplotlib.pyplot as plt
 import torch
 import torchvision
 
+from steerable.coeffs import PyramidCoeffs
+
 ################################################################################
 
 ToPIL = torchvision.transforms.ToPILImage()
@@ -42,10 +44,6 @@ def get_device(device='cuda:0'):
         print('No CUDA devices found, falling back to CPU')
         device = 'cpu'
 
-    if not torch.backends.mkl.is_available():
-        raise NotImplementedError(
-            'torch.fft on the CPU requires MKL back-end. ' +
-            'Please recompile your PyTorch distribution.')
     return torch.device('cpu')
 
 def load_image_batch(image_file, batch_size, image_size=200):
@@ -73,21 +71,28 @@ def extract_from_batch(coeff_batch, example_idx=0):
     '''
     Given the batched Complex Steerable Pyramid, extract the coefficients
     for a single example from the batch. Additionally, it converts all
-    torch.Tensor's to np.ndarrays' and changes creates proper np.complex
-    objects for all the orientation bands. 
+    torch.Tensor's to np.ndarrays', the complex orientation bands become
+    complex-valued np.ndarrays. 
 
     Args:
-        coeff_batch (list): list containing low-pass, high-pass and pyr levels
+        coeff_batch (list): list containing low-pass, high-pass and pyr levels,
+            or packed coefficients as PyramidCoeffs
         example_idx (int, optional): Defaults to 0. index in batch to extract
     
     Returns:
         list: list containing low-pass, high-pass and pyr levels as np.ndarray
     '''
+    if isinstance(coeff_batch, PyramidCoeffs):
+        coeff_batch = coeff_batch.to_list()
     if not isinstance(coeff_batch, list):
         raise ValueError('Batch of coefficients must be a list')
     coeff = []  # coefficient for single example
     for coeff_level in coeff_batch:
-        if isinstance(coeff_level, torch.Tensor):
+        if isinstance(coeff_level, torch.Tensor) and coeff_level.dim() == 4:
+            # Orientation bands stacked as [N,nbands,H,W]
+            coeff_level_numpy = coeff_level[example_idx].cpu().numpy()
+            coeff.append(list(coeff_level_numpy))
+        elif isinstance(coeff_level, torch.Tensor):
             # Low- or High-Pass
             coeff_level_numpy = coeff_level[example_idx].cpu().numpy()
             coeff.append(coeff_level_numpy)
@@ -95,7 +100,6 @@ def extract_from_batch(coeff_batch, example_idx=0):
             coeff_orientations_numpy = []
             for coeff_orientation in coeff_level:
                 coeff_orientation_numpy = coeff_orientation[example_idx].cpu().numpy()
-                coeff_orientation_numpy = coeff_orientation_numpy[:,:,0] + 1j*coeff_orientation_numpy[:,:,1]
                 coeff_orientations_numpy.append(coeff_orientation_numpy)
             coeff.append(coeff_orientations_numpy)
         else:
@@ -0,0 +1,71 @@
+# MIT License
+#
+# Copyright (c) 2018 Tom Runia
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to conditions.
+#
+# Author: Tom Runia
+# Date Created: 2026-10-16
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import torch
+
+################################################################################
+################################################################################
+
+
+class Workspace(object):
+    '''
+    Arena of scratch and output buffers for repeated `build` and
+    `reconstruct` calls of the same shape. Buffers are keyed on their name,
+    shape, dtype and device and allocated on first use only, so that from
+    the second call on all spectra, bands and outputs are written into
+    existing memory (with `out=` variants of the torch operators). The only
+    remaining allocations are the temporaries inside `torch.fft`, whose
+    `out=` variants compute into a new tensor and copy it:
+
+        workspace = Workspace()
+        for im_batch in loader:
+            coeff = pyr.build(im_batch, workspace=workspace)
+            ...
+
+    Coefficients and images returned by calls with a workspace are owned by
+    it and overwritten by the next call, unless `out` buffers are passed.
+    A workspace must not be shared between threads.
+    '''
+
+    def __init__(self):
+        self.buffers = {}
+        self.allocations = 0  # number of buffers allocated so far
+
+    def get(self, name, shape, dtype, device):
+        ''' Buffer of the given shape, dtype and device (uninitialized on
+        first use, afterwards holding the values of the previous call). '''
+        key = (name, tuple(shape), dtype, torch.device(device))
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            buffer = torch.empty(shape, dtype=dtype, device=device)
+            self.buffers[key] = buffer
+            self.allocations += 1
+        return buffer
+
+    @property
+    def nbytes(self):
+        return sum(b.numel() * b.element_size() for b in self.buffers.values())
+
+    def clear(self):
+        self.buffers.clear()
+
+    def __len__(self):
+        return len(self.buffers)
+
+    def __repr__(self):
+        return 'Workspace(buffers={}, nbytes={})'.format(len(self), self.nbytes)
@@ -0,0 +1,170 @@
+# MIT License
+#
+# Copyright (c) 2018 Tom Runia
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to conditions.
+#
+# Author: Tom Runia
+# Date Created: 2026-10-16
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import copy
+import fractions
+import pickle
+import warnings
+
+import numpy as np
+import pytest
+import torch
+
+from steerable.cache import LRUCache, FilterBankCache, PyramidCache
+from steerable.SCFpyr_NumPy import SCFpyr_NumPy
+from steerable.SCFpyr_PyTorch import SCFpyr_PyTorch
+
+################################################################################
+
+def test_lru_eviction_order():
+    cache = LRUCache(max_bytes=3*4*10)  # room for three float32 tensors of 10
+    for key in 'abc':
+        cache.put(key, torch.zeros(10))
+    cache.get('a')  # 'b' is now the least recently used entry
+    cache.put('d', torch.zeros(10))
+    assert 'b' not in cache
+    assert all(key in cache for key in 'acd')
+    assert cache.nbytes == 3*4*10
+    assert cache.evictions == 1
+
+def test_lru_hit_miss_counters():
+    cache = LRUCache(max_bytes=1024)
+    calls = []
+    factory = lambda: calls.append(1) or torch.ones(4)
+    cache.get('x', factory)
+    cache.get('x', factory)
+    cache.get('x', factory)
+    assert len(calls) == 1
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['misses'] == 1
+
+def test_lru_oversized_entry_kept_alone():
+    cache = LRUCache(max_bytes=64)
+    cache.put('small', torch.zeros(4))
+    with pytest.warns(UserWarning):
+        value = cache.get('big', lambda: torch.zeros(100))
+    assert value.numel() == 100
+    assert 'small' not in cache and cache.get('big') is value
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')  # warned once only
+        cache.put('bigger', torch.zeros(200))
+    assert 'big' not in cache and len(cache) == 1
+
+def test_lru_zero_cap_disables_caching():
+    cache = LRUCache(max_bytes=0)
+    cache.put('x', torch.zeros(4))
+    assert len(cache) == 0
+
+def test_lru_pickle_and_deepcopy():
+    cache = FilterBankCache()
+    pyr = SCFpyr_PyTorch(height=4, nbands=4, filter_cache=cache)
+    pyr.build(torch.rand(1, 1, 64, 64))
+    for copied in [pickle.loads(pickle.dumps(pyr)), copy.deepcopy(pyr)]:
+        assert len(copied.filter_cache) == 0 and copied.filter_cache.nbytes == 0
+        assert copied.filter_cache.max_bytes == cache.max_bytes
+        coeff = copied.build(torch.rand(1, 1, 64, 64))
+        assert len(copied.filter_cache) == 1 and len(coeff) == 4
+    assert len(cache) == 1
+
+def test_filter_bank_key():
+    key1 = FilterBankCache.make_key(64, 64, 5, 4, 2, torch.float32, 'cpu')
+    key2 = FilterBankCache.make_key(64, 64, 5, 4, 2.0, torch.float32, torch.device('cpu'))
+    key3 = FilterBankCache.make_key(64, 64, 5, 8, 2, torch.float32, 'cpu')
+    assert key1 == key2
+    assert key1 != key3
+
+def test_pyramid_cache_memory_hits():
+    cache = PyramidCache()
+    pyr = SCFpyr_PyTorch(height=3, nbands=4)
+    im_batch = torch.rand(2, 1, 64, 80)
+    coeff = cache.build(pyr, im_batch)
+    coeff_cached = cache.build(pyr, im_batch.clone())
+    assert all(a is b for a, b in zip(coeff, coeff_cached))
+    cache.build(SCFpyr_PyTorch(height=3, nbands=6), im_batch)  # other config
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 2
+    assert stats['hit_rate'] == 1/3
+
+def test_pyramid_cache_disk_tier(tmp_path):
+    pyr = SCFpyr_NumPy(height=3, nbands=4)
+    im = np.random.RandomState(0).rand(64, 64)
+    coeff = PyramidCache(path=str(tmp_path)).build(pyr, im)
+    cache = PyramidCache(path=str(tmp_path))  # new process, empty memory tier
+    coeff_cached = cache.build(pyr, im)
+    assert cache.stats()['disk_hits'] == 1
+    assert np.array_equal(coeff_cached[0], coeff[0])
+    assert np.array_equal(coeff_cached[1][2], coeff[1][2])
+
+def test_pyramid_cache_disk_eviction(tmp_path):
+    pyr = SCFpyr_PyTorch(height=3, nbands=4)
+    cache = PyramidCache(path=str(tmp_path), max_disk_bytes=400*1024)
+    for _ in range(5):
+        cache.build(pyr, torch.rand(1, 1, 64, 64))
+    stats = cache.stats()
+    assert 0 < stats['disk_entries'] < 5
+    assert stats['disk_nbytes'] <= 400*1024
+    assert len(list(tmp_path.iterdir())) == stats['disk_entries']
+
+def test_pyramid_cache_bfloat16_inputs(tmp_path):
+    cache = PyramidCache(path=str(tmp_path))
+    pyr = SCFpyr_PyTorch(height=3, nbands=4)
+    im_batch = torch.rand(1, 1, 64, 64).to(torch.bfloat16)
+    coeff = cache.build(pyr, im_batch)
+    assert PyramidCache.make_key(pyr, im_batch) != PyramidCache.make_key(pyr, im_batch.float())
+    coeff_cached = PyramidCache(path=str(tmp_path)).build(pyr, im_batch)
+    assert coeff_cached[1].dtype == torch.complex32
+    assert torch.equal(coeff_cached[0], coeff[0])
+
+def test_pyramid_cache_disk_tier_loads_tensors_only(tmp_path):
+    # Files of a shared directory are not unpickled as arbitrary objects
+    pyr = SCFpyr_NumPy(height=3, nbands=4)
+    im = np.random.RandomState(0).rand(64, 64)
+    cache = PyramidCache(path=str(tmp_path))
+    key = cache.make_key(pyr, im)
+    torch.save({'numpy': False, 'coeff': fractions.Fraction(1, 3)}, cache._filename(key))
+    cache = PyramidCache(path=str(tmp_path))
+    coeff = cache.build(pyr, im)
+    assert cache.stats()['misses'] == 1 and isinstance(coeff[0], np.ndarray)
+
+def test_pyramid_cache_bypassed_for_grad_inputs():
+    cache = PyramidCache()
+    pyr = SCFpyr_PyTorch(height=3, nbands=4)
+    im_batch = torch.rand(1, 1, 64, 64)
+    x1 = im_batch.clone().requires_grad_()
+    cache.build(pyr, x1)[0].abs().sum().backward()
+    grad = x1.grad.clone()
+    x2 = im_batch.clone().requires_grad_()
+    cache.build(pyr, x2)[0].abs().sum().backward()
+    assert x2.grad is not None and torch.allclose(x2.grad, grad)
+    assert torch.equal(x1.grad, grad)
+    assert len(cache.memory) == 0
+
+def test_pyramid_cache_shared_directory(tmp_path):
+    pyr = SCFpyr_NumPy(height=3, nbands=4)
+    im = np.random.RandomState(0).rand(64, 64)
+    (tmp_path / 'stale.pt.tmp').write_bytes(b'partial')
+    cache1 = PyramidCache(path=str(tmp_path))
+    cache1.build(pyr, im)
+    assert not (tmp_path / 'stale.pt.tmp').exists()
+    cache2 = PyramidCache(path=str(tmp_path))
+    cache3 = PyramidCache(path=str(tmp_path))
+    cache1.clear()
+    cache3.clear()  # files already removed by the other instance
+    coeff = cache2.build(pyr, im)  # file removed by the other instance
+    assert cache2.stats()['misses'] == 1 and cache2.stats()['disk_hits'] == 0
+    assert np.allclose(coeff[0], pyr.build(im)[0])
@@ -0,0 +1,49 @@
+# MIT License
+#
+# Copyright (c) 2018 Tom Runia
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to conditions.
+#
+# Author: Tom Runia
+# Date Created: 2026-10-16
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import pytest
+import torch
+
+import steerable.codec as codec
+from steerable.SCFpyr_PyTorch import SCFpyr_PyTorch
+from steerable.coeffs import PyramidCoeffs
+
+################################################################################
+
+@pytest.mark.parametrize('dtype,min_snr', [(torch.int8, 45), (torch.float16, 75)])
+@pytest.mark.parametrize('mode', ['cartesian', 'polar'])
+def test_codec_snr(dtype, min_snr, mode):
+    torch.manual_seed(0)
+    pyr = SCFpyr_PyTorch(height=4, nbands=4)
+    coeffs = PyramidCoeffs.from_list(pyr.build(torch.rand(3, 1, 64, 80)))
+    encoded = codec.encode(coeffs, dtype=dtype, mode=mode)
+    assert encoded.data.dtype == dtype
+    assert encoded.nbytes < coeffs.nbytes * (0.3 if dtype == torch.int8 else 0.55)
+    snr = codec.reconstruction_snr(pyr, coeffs, codec.decode(encoded))
+    assert snr.shape == (3,)
+    assert torch.all(snr > min_snr)
+
+def test_codec_per_band_range():
+    # Each band is scaled to its own range, even if the ranges differ a lot
+    torch.manual_seed(0)
+    pyr = SCFpyr_PyTorch(height=3, nbands=4, downsample_bands=True)
+    coeff = pyr.build(torch.rand(2, 1, 63, 81))
+    coeff[1][0] = coeff[1][0] * 1e-3
+    decoded = codec.encode(coeff).decode()
+    error = (decoded[1,0] - coeff[1][0]).abs().max()
+    assert error < 1e-2 * coeff[1][0].abs().max()
@@ -0,0 +1,81 @@
+# MIT License
+#
+# Copyright (c) 2018 Tom Runia
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to conditions.
+#
+# Author: Tom Runia
+# Date Created: 2026-10-16
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import io
+
+import pytest
+import torch
+
+from steerable.SCFpyr_PyTorch import SCFpyr_PyTorch
+from steerable.coeffs import PyramidCoeffs
+
+################################################################################
+
+def build_coeff(downsample_bands=False, shape=(63, 81)):
+    torch.manual_seed(0)
+    pyr = SCFpyr_PyTorch(height=3, nbands=4, downsample_bands=downsample_bands)
+    return pyr, pyr.build(torch.rand(2, 1, *shape))
+
+@pytest.mark.parametrize('downsample_bands', [False, True])
+def test_pack_roundtrip(downsample_bands):
+    pyr, coeff = build_coeff(downsample_bands)
+    coeffs = PyramidCoeffs.from_list(coeff)
+    assert coeffs.buffer.is_contiguous()
+    for level, value in zip(coeffs.to_list(), coeff):
+        if isinstance(value, list):
+            assert all(torch.equal(a, b) for a, b in zip(level, value))
+        else:
+            assert torch.equal(level, value)
+    assert torch.equal(pyr.reconstruct(coeffs), pyr.reconstruct(coeff))
+
+@pytest.mark.parametrize('dtype', [torch.float32, torch.bfloat16])
+def test_pack_without_band_levels(dtype):
+    pyr = SCFpyr_PyTorch(height=2, nbands=4)
+    coeff = pyr.build(torch.rand(2, 1, 64, 64).to(dtype))
+    coeffs = PyramidCoeffs.from_list(coeff)
+    assert len(coeffs) == 2 and coeffs.dtype == dtype
+    assert torch.equal(coeffs[0], coeff[0]) and torch.equal(coeffs[1], coeff[1])
+    assert torch.equal(pyr.reconstruct(coeffs), pyr.reconstruct(coeff))
+
+def test_views_share_buffer():
+    _, coeff = build_coeff()
+    coeffs = PyramidCoeffs.from_list(coeff)
+    band = coeffs[1, 2]
+    assert band.shape == (2, 63, 81)
+    band.zero_()
+    assert torch.all(coeffs[1][:,2] == 0)
+    assert torch.equal(coeffs[1][:,1], coeff[1][:,1])
+
+def test_whole_buffer_operations():
+    _, coeff = build_coeff()
+    coeffs = PyramidCoeffs.from_list(coeff)
+    scaled = 2*coeffs - coeffs/2
+    assert torch.allclose(scaled[1], 1.5*coeff[1])
+    assert torch.allclose(scaled[-1], 1.5*coeff[-1])
+    moved = coeffs.to(torch.float64)
+    assert moved[1].dtype == torch.complex128
+
+def test_serialization():
+    _, coeff = build_coeff()
+    coeffs = PyramidCoeffs.from_list(coeff)
+    f = io.BytesIO()
+    torch.save(coeffs, f)
+    f.seek(0)
+    loaded = torch.load(f, weights_only=False)
+    assert loaded.layout == coeffs.layout
+    assert torch.equal(loaded.buffer, coeffs.buffer)
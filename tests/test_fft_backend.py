@@ -0,0 +1,129 @@
+# MIT License
+#
+# Copyright (c) 2018 Tom Runia
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to conditions.
+#
+# Author: Tom Runia
+# Date Created: 2026-10-16
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import pickle
+import sys
+import types
+
+import numpy as np
+import pytest
+
+import steerable.fft_backend as fft_backend
+from steerable.SCFpyr_NumPy import SCFpyr_NumPy
+
+################################################################################
+
+@pytest.mark.parametrize('downsample_bands', [False, True])
+def test_scipy_backend_matches_numpy(downsample_bands):
+    ims = np.random.RandomState(0).rand(3, 64, 80)
+    pyr = SCFpyr_NumPy(height=4, nbands=4, downsample_bands=downsample_bands)
+    pyr_scipy = SCFpyr_NumPy(height=4, nbands=4, downsample_bands=downsample_bands,
+                             fft_backend='scipy', fft_workers=2)
+    assert pyr_scipy.fft.name == 'scipy'
+    coeff, coeff_scipy = pyr.build(ims), pyr_scipy.build(ims)
+    assert np.allclose(coeff[0], coeff_scipy[0], atol=1e-12)
+    assert np.allclose(coeff[-1], coeff_scipy[-1], atol=1e-12)
+    for level, level_scipy in zip(coeff[1:-1], coeff_scipy[1:-1]):
+        assert all(np.allclose(band, band_scipy, atol=1e-12) for band, band_scipy in zip(level, level_scipy))
+    assert np.allclose(pyr_scipy.reconstruct(coeff_scipy), pyr.reconstruct(coeff), atol=1e-12)
+
+def test_backend_from_environment(monkeypatch):
+    monkeypatch.setenv('STEERABLE_FFT_BACKEND', 'scipy')
+    monkeypatch.setenv('STEERABLE_FFT_WORKERS', '-1')
+    backend = fft_backend.get_backend()
+    assert backend.name == 'scipy' and backend.workers == -1
+    assert fft_backend.get_backend('numpy').name == 'numpy'
+
+def test_invalid_workers_in_environment(monkeypatch):
+    monkeypatch.setenv('STEERABLE_FFT_WORKERS', 'all')
+    with pytest.raises(ValueError, match='STEERABLE_FFT_WORKERS'):
+        fft_backend.get_backend('numpy')
+
+def test_missing_backend_falls_back_to_numpy(monkeypatch):
+    class MissingBackend(fft_backend.NumPyBackend):
+        def __init__(self, workers=None):
+            raise ImportError('No module named missing')
+    monkeypatch.setitem(fft_backend.backends, 'missing', MissingBackend)
+    with pytest.warns(UserWarning):
+        assert fft_backend.get_backend('missing').name == 'numpy'
+    with pytest.raises(ValueError):
+        fft_backend.get_backend('unknown')
+
+def test_pyfftw_backend_saves_wisdom(tmp_path, monkeypatch):
+    pytest.importorskip('pyfftw')
+    exit_handlers = []
+    monkeypatch.setattr(fft_backend, '_wisdom_files', set())
+    monkeypatch.setattr(fft_backend.atexit, 'register', lambda *args: exit_handlers.append(args))
+    wisdom = str(tmp_path / 'wisdom.pkl')
+    backend = fft_backend.PyFFTWBackend(workers=2, wisdom=wisdom)
+    x = np.random.RandomState(0).rand(2, 64, 80)
+    assert np.allclose(backend.irfft2(backend.rfft2(x), x.shape[-2:]), x)
+    backend.save_wisdom()
+    assert os.path.isfile(wisdom)
+    # The wisdom file is loaded once per process and saved by one exit handler
+    assert fft_backend.PyFFTWBackend(wisdom=wisdom).wisdom == wisdom
+    assert len(exit_handlers) == 1
+
+def stub_pyfftw(monkeypatch):
+    # Minimal pyfftw with the numpy interface, recording the calls
+    pyfftw = types.ModuleType('pyfftw')
+    interfaces = types.ModuleType('pyfftw.interfaces')
+    numpy_fft = types.ModuleType('pyfftw.interfaces.numpy_fft')
+    cache = types.ModuleType('pyfftw.interfaces.cache')
+    pyfftw.calls = []
+    pyfftw.import_wisdom = lambda wisdom: pyfftw.calls.append(('import_wisdom', wisdom))
+    pyfftw.export_wisdom = lambda: (b'wisdom',)
+    cache.enable = lambda: pyfftw.calls.append(('enable',))
+    cache.set_keepalive_time = lambda seconds: pyfftw.calls.append(('keepalive', seconds))
+    for name in ['fft2', 'ifft2', 'rfft2', 'irfft2']:
+        def transform(x, s=None, threads=None, planner_effort=None, name=name):
+            pyfftw.calls.append((name, threads, planner_effort))
+            return getattr(np.fft, name)(x, s=s)
+        setattr(numpy_fft, name, transform)
+    pyfftw.interfaces, interfaces.numpy_fft, interfaces.cache = interfaces, numpy_fft, cache
+    for module in [pyfftw, interfaces, numpy_fft, cache]:
+        monkeypatch.setitem(sys.modules, module.__name__, module)
+    return pyfftw
+
+def test_pyfftw_backend_with_stub(tmp_path, monkeypatch):
+    pyfftw = stub_pyfftw(monkeypatch)
+    exit_handlers = []
+    monkeypatch.setattr(fft_backend, '_wisdom_files', set())
+    monkeypatch.setattr(fft_backend.atexit, 'register', lambda *args: exit_handlers.append(args))
+    wisdom = str(tmp_path / 'wisdom.pkl')
+    with open(wisdom, 'wb') as f:
+        pickle.dump((b'saved',), f)
+
+    backend = fft_backend.PyFFTWBackend(workers=2, wisdom=wisdom)
+    fft_backend.PyFFTWBackend(wisdom=wisdom)
+    assert pyfftw.calls.count(('import_wisdom', (b'saved',))) == 1 and len(exit_handlers) == 1
+    assert ('keepalive', 600) in pyfftw.calls
+
+    x = np.random.RandomState(0).rand(2, 64, 80)
+    assert np.allclose(backend.irfft2(backend.rfft2(x), x.shape[-2:]), x)
+    assert ('rfft2', 2, 'FFTW_MEASURE') in pyfftw.calls
+    pyr = SCFpyr_NumPy(height=4, nbands=4, fft_backend=backend)
+    coeff, coeff_numpy = pyr.build(x[0]), SCFpyr_NumPy(height=4, nbands=4).build(x[0])
+    assert np.allclose(coeff[1][2], coeff_numpy[1][2], atol=1e-12)
+
+    exit_handlers[0][0](*exit_handlers[0][1:])
+    with open(wisdom, 'rb') as f:
+        assert pickle.load(f) == (b'wisdom',)
+    with pytest.raises(ValueError):
+        fft_backend.PyFFTWBackend().save_wisdom()
@@ -0,0 +1,51 @@
+# MIT License
+#
+# Copyright (c) 2018 Tom Runia
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to conditions.
+#
+# Author: Tom Runia
+# Date Created: 2026-10-16
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import pytest
+import torch
+
+import steerable.functional as functional
+from steerable.SCFpyr_PyTorch import SCFpyr_PyTorch
+
+################################################################################
+
+tolerance = 1e-4
+
+def make_batch(height, width, batch_size=2, seed=0):
+    rng = np.random.RandomState(seed)
+    return torch.from_numpy(rng.rand(batch_size, 1, height, width)).float()
+
+def check_functional(build, reconstruct, shape=(64, 80)):
+    im_batch = make_batch(*shape)
+    plan = SCFpyr_PyTorch(height=4, nbands=4).plan(shape)
+    coeff = build(im_batch, *functional.build_inputs(plan.filters))
+    for c, c_plan in zip(coeff, plan.build(im_batch)):
+        assert torch.allclose(c, c_plan, atol=tolerance)
+    reconstruction = reconstruct(coeff, *functional.reconstruct_inputs(plan.filters))
+    assert torch.allclose(reconstruction, im_batch[:,0], atol=tolerance)
+
+def test_functional_matches_plan():
+    check_functional(functional.build, functional.reconstruct)
+
+def test_functional_script():
+    check_functional(torch.jit.script(functional.build), torch.jit.script(functional.reconstruct))
+
+@pytest.mark.skipif(not hasattr(torch, 'compile'), reason='requires torch.compile')
+def test_functional_compile():
+    check_functional(torch.compile(functional.build), torch.compile(functional.reconstruct))
@@ -0,0 +1,69 @@
+# MIT License
+#
+# Copyright (c) 2018 Tom Runia
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to conditions.
+#
+# Author: Tom Runia
+# Date Created: 2026-10-16
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import math
+
+import numpy as np
+import pytest
+
+import steerable.math_utils as math_utils
+
+################################################################################
+
+# Linear interpolation in the 256/1024-entry lookup tables of pointOp
+tolerance = 1e-5
+
+@pytest.mark.parametrize('shape', [(64, 80), (63, 81), (200, 200)])
+def test_grid_matches_numpy(shape):
+    log_rad, angle = math_utils.prepare_grid(*shape)
+    log_rad_torch, angle_torch = math_utils.prepare_grid_torch(*shape)
+    assert np.allclose(log_rad, log_rad_torch.numpy(), atol=1e-12)
+    assert np.allclose(angle, angle_torch.numpy(), atol=1e-12)
+
+@pytest.mark.parametrize('level', [0, 1, 2])
+def test_rcos_masks_match_lut(level):
+    log_rad, _ = math_utils.prepare_grid(64, 80)
+    log_rad_torch, _ = math_utils.prepare_grid_torch(64, 80)
+    Xrcos, Yrcos = math_utils.rcosFn(1, -0.5)
+    Xrcos = Xrcos - level
+    Yrcos = np.sqrt(Yrcos)
+    YIrcos = np.sqrt(np.abs(1 - Yrcos**2))
+    lomask, himask = math_utils.rcos_masks(log_rad_torch, 1, -0.5 - level)
+    assert np.allclose(math_utils.pointOp(log_rad, Yrcos, Xrcos), himask.numpy(), atol=tolerance)
+    assert np.allclose(math_utils.pointOp(log_rad, YIrcos, Xrcos), lomask.numpy(), atol=tolerance)
+
+@pytest.mark.parametrize('nbands', [2, 4, 6])
+def test_angle_masks_match_lut(nbands):
+    _, angle = math_utils.prepare_grid(64, 80)
+    _, angle_torch = math_utils.prepare_grid_torch(64, 80)
+
+    lutsize = 1024
+    Xcosn = np.pi * np.array(range(-(2*lutsize+1), (lutsize+2)))/lutsize
+    alpha = (Xcosn + np.pi) % (2*np.pi) - np.pi
+    order = nbands - 1
+    const = np.power(2, 2*order) * np.square(math.factorial(order)) / (nbands * math.factorial(2*order))
+    Ycosn = 2*np.sqrt(const) * np.power(np.cos(Xcosn), order) * (np.abs(alpha) < np.pi/2)
+    Ycosn_recon = np.sqrt(const) * np.power(np.cos(Xcosn), order)
+
+    anglemasks = math_utils.angle_masks(angle_torch, nbands).numpy()
+    anglemasks_recon = math_utils.angle_masks(angle_torch, nbands, reconstruct=True).numpy()
+    for b in range(nbands):
+        expected = math_utils.pointOp(angle, Ycosn, Xcosn + np.pi*b/nbands)
+        expected_recon = math_utils.pointOp(angle, Ycosn_recon, Xcosn + np.pi*b/nbands)
+        assert np.allclose(expected, anglemasks[b], atol=tolerance)
+        assert np.allclose(expected_recon, anglemasks_recon[b], atol=tolerance)
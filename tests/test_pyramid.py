@@ -0,0 +1,348 @@
+# MIT License
+#
+# Copyright (c) 2018 Tom Runia
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to conditions.
+#
+# Author: Tom Runia
+# Date Created: 2026-10-16
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import copy
+import pickle
+
+import numpy as np
+import pytest
+import torch
+
+import steerable.math_utils as math_utils
+from steerable.cache import FilterBankCache
+from steerable.SCFpyr_NumPy import SCFpyr_NumPy
+from steerable.SCFpyr_PyTorch import SCFpyr_PyTorch, SCFpyrModule, ddp_ignore_filters, flatten_coeff, unflatten_coeff
+
+################################################################################
+
+# Tolerance for comparing the float32 PyTorch and float64 NumPy results
+tolerance = 1e-4
+
+def make_image(height, width, seed=0):
+    rng = np.random.RandomState(seed)
+    return rng.rand(height, width)
+
+def assert_coeff_close(coeff_numpy, coeff_torch, example_idx=0, atol=tolerance):
+    assert len(coeff_numpy) == len(coeff_torch)
+    assert np.allclose(coeff_numpy[0], coeff_torch[0][example_idx].numpy(), atol=atol)
+    assert np.allclose(coeff_numpy[-1], coeff_torch[-1][example_idx].numpy(), atol=atol)
+    for level in range(1, len(coeff_numpy)-1):
+        for band, band_numpy in enumerate(coeff_numpy[level]):
+            band_torch = coeff_torch[level][example_idx,band].numpy()
+            assert np.allclose(band_numpy, band_torch, atol=atol)
+
+@pytest.mark.parametrize('shape,height,nbands', [
+    ((64, 64), 4, 4),
+    ((64, 80), 4, 6),
+    ((63, 81), 3, 4),
+])
+def test_torch_matches_numpy(shape, height, nbands):
+    im = make_image(*shape)
+    coeff_numpy = SCFpyr_NumPy(height, nbands).build(im)
+    coeff_torch = SCFpyr_PyTorch(height, nbands).build(torch.from_numpy(im[None,None]).float())
+    assert coeff_torch[1].is_complex()
+    assert coeff_torch[1].shape == (1, nbands) + shape
+    assert_coeff_close(coeff_numpy, coeff_torch)
+
+@pytest.mark.parametrize('shape', [(64, 64), (64, 80)])
+def test_torch_reconstruction(shape):
+    im_batch = torch.from_numpy(np.stack([make_image(*shape, seed=i) for i in range(3)])[:,None]).float()
+    pyr = SCFpyr_PyTorch(height=4, nbands=4)
+    reconstruction = pyr.reconstruct(pyr.build(im_batch))
+    assert torch.allclose(reconstruction, im_batch[:,0], atol=tolerance)
+
+def test_torch_reconstruction_from_band_list():
+    im_batch = torch.from_numpy(make_image(64, 64)[None,None]).float()
+    pyr = SCFpyr_PyTorch(height=4, nbands=4)
+    coeff = pyr.build(im_batch)
+    coeff_list = [coeff[0]] + [list(torch.unbind(c, 1)) for c in coeff[1:-1]] + [coeff[-1]]
+    assert torch.allclose(pyr.reconstruct(coeff_list), pyr.reconstruct(coeff))
+
+def test_plan_matches_build():
+    im_batch = torch.from_numpy(make_image(64, 80)[None,None]).float()
+    pyr = SCFpyr_PyTorch(height=4, nbands=4)
+    plan = pyr.plan(im_batch.shape)
+    coeff_plan = plan.build(im_batch)
+    coeff = pyr.build(im_batch)
+    for c_plan, c in zip(coeff_plan, coeff):
+        assert torch.equal(c_plan, c)
+    assert torch.allclose(plan.reconstruct(coeff_plan), im_batch[:,0], atol=tolerance)
+
+def test_plan_rejects_other_shape():
+    pyr = SCFpyr_PyTorch(height=4, nbands=4)
+    with pytest.raises(AssertionError):
+        pyr.plan((64, 64)).build(torch.zeros(1, 1, 64, 80))
+
+@pytest.mark.parametrize('downsample_bands', [False, True])
+def test_iter_build_matches_build(downsample_bands):
+    im = make_image(64, 80)
+    im_batch = torch.from_numpy(im[None,None]).float()
+    pyr = SCFpyr_PyTorch(height=4, nbands=4, downsample_bands=downsample_bands)
+    coeff = pyr.build(im_batch)
+    coeff_iter = list(pyr.iter_build(im_batch))
+    assert len(coeff_iter) == len(coeff)
+    for c_iter, c in zip(coeff_iter, coeff):
+        for b_iter, b in zip(c_iter if downsample_bands else [c_iter], c if downsample_bands else [c]):
+            assert torch.equal(b_iter, b)
+
+@pytest.mark.parametrize('downsample_bands', [False, True])
+def test_reconstruct_stream_matches_reconstruct(downsample_bands):
+    im_batch = torch.from_numpy(np.stack([make_image(64, 80, seed=i) for i in range(2)])[:,None]).float()
+    pyr = SCFpyr_PyTorch(height=4, nbands=4, downsample_bands=downsample_bands)
+    coeff = pyr.build(im_batch)
+    reconstruction = pyr.reconstruct_stream(iter(coeff[::-1]), im_batch.shape)
+    assert torch.equal(reconstruction, pyr.reconstruct(coeff))
+    assert torch.allclose(reconstruction, im_batch[:,0], atol=tolerance)
+
+def test_reconstruct_stream_without_residuals():
+    im_batch = torch.from_numpy(make_image(64, 80)[None,None]).double()
+    pyr = SCFpyr_PyTorch(height=4, nbands=4)
+    coeff = pyr.build(im_batch, residuals=False)
+    reconstruction = pyr.reconstruct_stream(iter(coeff[::-1]), im_batch.shape)
+    assert reconstruction.dtype == torch.float64
+    assert torch.equal(reconstruction, pyr.reconstruct(coeff, shape=im_batch.shape))
+    reconstruction = pyr.reconstruct_stream(iter(coeff[::-1]), im_batch.shape, dtype=torch.float64)
+    assert torch.equal(reconstruction, pyr.reconstruct(coeff, shape=im_batch.shape))
+    with pytest.raises(ValueError):
+        pyr.reconstruct_stream(iter([None]*4), im_batch.shape)
+
+@pytest.mark.parametrize('downsample_bands', [False, True])
+def test_partial_build(downsample_bands):
+    im_batch = torch.from_numpy(np.stack([make_image(64, 80, seed=i) for i in range(2)])[:,None]).float()
+    pyr = SCFpyr_PyTorch(height=4, nbands=4, downsample_bands=downsample_bands)
+    coeff = pyr.build(im_batch)
+    partial = pyr.build(im_batch, levels=[1], bands=[0, 2], residuals=False)
+    assert partial[0] is None and partial[1] is None and partial[-1] is None
+    bands = coeff[2] if downsample_bands else list(torch.unbind(coeff[2], 1))
+    assert partial[2][1] is None and partial[2][3] is None
+    assert torch.allclose(partial[2][0], bands[0]) and torch.allclose(partial[2][2], bands[2])
+
+    # Missing entries are reconstructed as zeros
+    coeff_zeros = [[torch.zeros_like(b) for b in c] if isinstance(c, list) else torch.zeros_like(c) for c in coeff]
+    coeff_zeros[2] = [bands[b] if b in (0, 2) else torch.zeros_like(bands[b]) for b in range(4)]
+    expected = pyr.reconstruct(coeff_zeros)
+    assert torch.allclose(pyr.reconstruct(partial, im_batch.shape), expected, atol=1e-6)
+    with pytest.raises(ValueError):
+        pyr.reconstruct(partial)
+
+def test_partial_build_residuals_only():
+    im_batch = torch.from_numpy(make_image(64, 64)[None,None]).float()
+    pyr = SCFpyr_PyTorch(height=4, nbands=4)
+    coeff = pyr.build(im_batch)
+    partial = pyr.build(im_batch, levels=[])
+    assert all(level is None for level in partial[1:-1])
+    assert torch.equal(partial[0], coeff[0]) and torch.equal(partial[-1], coeff[-1])
+    coeff_bands = [None] + coeff[1:-1] + [None]
+    reconstruction = pyr.reconstruct(partial) + pyr.reconstruct(coeff_bands, im_batch.shape)
+    assert torch.allclose(reconstruction, im_batch[:,0], atol=tolerance)
+
+@pytest.mark.parametrize('downsample_bands', [False, True])
+def test_memory_budget_chunks_batch(downsample_bands):
+    im_batch = torch.from_numpy(np.stack([make_image(64, 80, seed=i) for i in range(7)])[:,None]).float()
+    pyr = SCFpyr_PyTorch(height=4, nbands=4, downsample_bands=downsample_bands)
+    plan = pyr.plan(im_batch.shape)
+    outputs, temporaries = plan.memory_per_example()
+    budget = 7*outputs + 2*(outputs + temporaries)
+    assert plan.max_batch_size(budget, 7) == 2
+
+    coeff = pyr.build(im_batch)
+    coeff_chunked = pyr.build(im_batch, max_memory_bytes=budget)
+    tensors, _ = flatten_coeff(coeff)
+    for t, t_chunked in zip(tensors, flatten_coeff(coeff_chunked)[0]):
+        assert torch.allclose(t, t_chunked, atol=1e-6)
+
+    outputs, temporaries = plan.memory_per_example('reconstruct')
+    reconstruction = pyr.reconstruct(coeff, max_memory_bytes=7*outputs + 3*(outputs + temporaries))
+    assert torch.allclose(reconstruction, pyr.reconstruct(coeff), atol=1e-6)
+    with pytest.raises(RuntimeError):
+        pyr.build(im_batch, max_memory_bytes=7*outputs)
+
+@pytest.mark.parametrize('downsample_bands', [False, True])
+def test_parallel_levels_match_sequential(downsample_bands):
+    im_batch = torch.from_numpy(np.stack([make_image(64, 80, seed=i) for i in range(2)])[:,None]).float()
+    pyr = SCFpyr_PyTorch(height=4, nbands=4, downsample_bands=downsample_bands)
+    pyr_parallel = SCFpyr_PyTorch(height=4, nbands=4, downsample_bands=downsample_bands, num_workers=4)
+    coeff = pyr.build(im_batch)
+    coeff_parallel = pyr_parallel.build(im_batch)
+    for t, t_parallel in zip(flatten_coeff(coeff)[0], flatten_coeff(coeff_parallel)[0]):
+        assert torch.equal(t, t_parallel)
+    assert torch.equal(pyr_parallel.reconstruct(coeff), pyr.reconstruct(coeff))
+
+    partial = pyr_parallel.build(im_batch, levels=[1], bands=[0])
+    assert partial[1] is None and torch.equal(partial[2][0], coeff[2][0] if downsample_bands else coeff[2][:,0])
+
+    # Partial pyramids are differentiated by autograd on the worker threads
+    im_batch.requires_grad_(True)
+    grads = [torch.autograd.grad(p.build(im_batch, levels=[1], bands=[0])[2][0].abs().sum(), im_batch)[0]
+             for p in (pyr, pyr_parallel)]
+    assert torch.allclose(grads[0], grads[1])
+
+@pytest.mark.parametrize('downsample_bands', [False, True])
+def test_numpy_batched_build(downsample_bands):
+    ims = np.stack([make_image(64, 80, seed=i) for i in range(6)]).reshape(2, 3, 64, 80)
+    pyr = SCFpyr_NumPy(height=4, nbands=4, downsample_bands=downsample_bands)
+    coeff = pyr.build(ims)
+    for n, c in [(0, 0), (1, 2)]:
+        coeff_single = pyr.build(ims[n,c])
+        assert np.array_equal(coeff[0][n,c], coeff_single[0])
+        assert np.array_equal(coeff[-1][n,c], coeff_single[-1])
+        for level, level_single in zip(coeff[1:-1], coeff_single[1:-1]):
+            assert all(np.array_equal(band[n,c], band_single) for band, band_single in zip(level, level_single))
+    reconstruction = pyr.reconstruct(coeff)
+    assert reconstruction.shape == ims.shape
+    assert np.allclose(reconstruction[1,2], pyr.reconstruct(pyr.build(ims[1,2])))
+
+def test_numpy_iter_build_matches_build():
+    im = make_image(64, 80)
+    pyr = SCFpyr_NumPy(height=4, nbands=4)
+    coeff = pyr.build(im)
+    coeff_iter = pyr.iter_build(im)
+    assert np.array_equal(next(coeff_iter), coeff[0])
+    for level in coeff[1:-1]:
+        assert all(np.array_equal(a, b) for a, b in zip(next(coeff_iter), level))
+    assert np.array_equal(next(coeff_iter), coeff[-1])
+    assert next(coeff_iter, None) is None
+
+def test_bandlimited_levels_match_numpy():
+    # With scale factor 4 the low-pass support shrinks faster than the
+    # spectra are cropped, so the band products are restricted to a box
+    im = make_image(128, 128)
+    pyr = SCFpyr_PyTorch(height=5, nbands=4, scale_factor=4)
+    assert any(level['box'] is not None for level in pyr.get_filters(128, 128)['levels'])
+    coeff_numpy = SCFpyr_NumPy(height=5, nbands=4, scale_factor=4).build(im)
+    coeff_torch = pyr.build(torch.from_numpy(im[None,None]).float())
+    assert_coeff_close(coeff_numpy, coeff_torch)
+
+def test_band_boxes_default_configuration():
+    # With scale factor 2 the low-pass support fills each spectrum, but each
+    # analytic band covers only about half of it, so the adjoint of build
+    # accumulates the bands inside their own boxes
+    torch.manual_seed(0)
+    pyr = SCFpyr_PyTorch(height=4, nbands=4)
+    plan = pyr.plan((64, 80))
+    assert all(level['box'] is None for level in plan.levels)
+    assert all(sum(box['area'] for box in level['band_boxes']) < 0.75*4 for level in plan.levels)
+    coeff = unflatten_coeff([torch.randn_like(c) for c in flatten_coeff(plan.analysis(torch.rand(2, 64, 80)))[0]],
+                            plan.coeff_structure())
+    full = SCFpyr_PyTorch(height=4, nbands=4, filter_cache=FilterBankCache(max_bytes=0)).plan((64, 80))
+    for level in full.levels:
+        level['band_boxes'] = [math_utils.support_box(torch.ones(level['bandmasks'].shape[-2:], dtype=torch.bool))]*4
+    assert torch.allclose(plan.synthesis(coeff, adjoint=True), full.synthesis(coeff, adjoint=True), atol=1e-5)
+
+@pytest.mark.parametrize('shape,height', [((64, 64), 4), ((63, 81), 3)])
+def test_downsampled_bands(shape, height):
+    im = make_image(*shape)
+    im_batch = torch.from_numpy(im[None,None]).float()
+    pyr = SCFpyr_PyTorch(height, nbands=4, downsample_bands=True)
+    coeff_torch = pyr.build(im_batch)
+    coeff_numpy = SCFpyr_NumPy(height, nbands=4, downsample_bands=True).build(im)
+    for level in range(1, len(coeff_numpy)-1):
+        for band_numpy, band_torch in zip(coeff_numpy[level], coeff_torch[level]):
+            assert band_numpy.shape == band_torch.shape[1:]
+            assert np.allclose(band_numpy, band_torch[0].numpy(), atol=tolerance)
+    # Axis-aligned bands cover half of the spectrum
+    assert coeff_torch[1][0].shape[-1] < shape[1]//2 + 2
+    assert torch.allclose(pyr.reconstruct(coeff_torch), im_batch[:,0], atol=tolerance)
+
+@pytest.mark.parametrize('downsample_bands', [False, True])
+def test_build_gradient_is_adjoint(downsample_bands):
+    # Gradients of the autograd function against autograd through the transform
+    torch.manual_seed(0)
+    plan = SCFpyr_PyTorch(height=4, nbands=4, downsample_bands=downsample_bands).plan((64, 80))
+    im_batch = torch.rand(2, 1, 64, 80, requires_grad=True)
+    coeff_ref, _ = flatten_coeff(plan.analysis(im_batch.squeeze(1)))
+    coeff, _ = flatten_coeff(plan.build(im_batch))
+    weights = [torch.randn_like(c) for c in coeff]
+    grad_ref, = torch.autograd.grad(sum((w.conj()*c).real.sum() for w, c in zip(weights, coeff_ref)), im_batch)
+    grad, = torch.autograd.grad(sum((w.conj()*c).real.sum() for w, c in zip(weights, coeff)), im_batch)
+    assert torch.allclose(grad, grad_ref, atol=tolerance)
+
+@pytest.mark.parametrize('downsample_bands', [False, True])
+def test_reconstruct_gradient_is_adjoint(downsample_bands):
+    torch.manual_seed(0)
+    plan = SCFpyr_PyTorch(height=4, nbands=4, downsample_bands=downsample_bands).plan((64, 80))
+    coeff, _ = flatten_coeff(plan.analysis(torch.rand(2, 64, 80)))
+    coeff = [c.requires_grad_() for c in coeff]
+    weights = torch.randn(2, 64, 80)
+    coeff_nested = unflatten_coeff(coeff, plan.coeff_structure())
+    grads_ref = torch.autograd.grad((plan.synthesis(coeff_nested)*weights).sum(), coeff)
+    grads = torch.autograd.grad((plan.reconstruct(coeff_nested)*weights).sum(), coeff)
+    for grad, grad_ref in zip(grads, grads_ref):
+        assert torch.allclose(grad, grad_ref, atol=tolerance)
+
+def test_module_matches_pyramid():
+    im_batch = torch.from_numpy(make_image(64, 80)[None,None]).float()
+    module = SCFpyrModule((64, 80), height=4, nbands=4)
+    assert len(module.state_dict()) == 0  # masks are non-persistent buffers
+    coeff_module = module(im_batch)
+    coeff = SCFpyr_PyTorch(height=4, nbands=4).build(im_batch)
+    for c_module, c in zip(coeff_module, coeff):
+        assert torch.equal(c_module, c)
+    assert torch.allclose(module.inverse(coeff_module), im_batch[:,0], atol=tolerance)
+
+def test_module_buffers_follow_dtype():
+    module = SCFpyrModule((64, 64), height=4, nbands=4).double()
+    assert module.filters_lo0mask.dtype == torch.float64
+    assert module.filters_levels_0_bandmasks.dtype == torch.complex128
+    im_batch = torch.from_numpy(make_image(64, 64)[None,None])
+    coeff = module(im_batch)
+    assert torch.allclose(module.inverse(coeff), im_batch[:,0], atol=1e-12)
+    coeff_pyr = SCFpyr_PyTorch(height=4, nbands=4).build(im_batch)
+    for c, c_pyr in zip(coeff, coeff_pyr):
+        assert torch.allclose(c, c_pyr, atol=1e-12)
+
+    module = module.half()
+    assert module.filters_levels_0_bandmasks.dtype == torch.complex32
+    assert module(im_batch.half())[1].dtype == torch.complex32
+
+def test_module_copy_and_pickle(tmp_path):
+    im_batch = torch.from_numpy(make_image(64, 80)[None,None]).float()
+    module = SCFpyrModule((64, 80), height=4, nbands=4)
+    coeff = module(im_batch)
+    torch.save(module, str(tmp_path / 'module.pt'))
+    copies = [copy.deepcopy(module), pickle.loads(pickle.dumps(module)),
+              torch.load(str(tmp_path / 'module.pt'), weights_only=False)]
+    for module_copy in copies:
+        assert all(torch.equal(c_copy, c) for c_copy, c in zip(module_copy(im_batch), coeff))
+        assert module_copy.double().filters_levels_0_bandmasks.dtype == torch.complex128
+
+def test_module_filters_ignored_by_ddp():
+    module = SCFpyrModule((64, 80), height=4, nbands=4)
+    names = [name for name, _ in module.named_buffers()]
+    assert sorted(module._ddp_params_and_buffers_to_ignore) == sorted(names)
+    model = torch.nn.Sequential(torch.nn.Identity(), module)
+    ddp_ignore_filters(model)
+    assert sorted(model._ddp_params_and_buffers_to_ignore) == sorted('1.' + name for name in names)
+
+@pytest.mark.parametrize('dtype,atol,atol_reconstruction', [
+    (torch.float64, tolerance, 1e-12),
+    (torch.float16, 1e-2, 2e-3),
+    (torch.bfloat16, 6e-2, 2e-2),
+])
+def test_dtype_error_bounds(dtype, atol, atol_reconstruction):
+    im = make_image(64, 80)
+    pyr = SCFpyr_PyTorch(height=4, nbands=4)
+    coeff = pyr.build(torch.from_numpy(im[None,None]).to(dtype))
+    assert coeff[0].dtype == dtype
+    assert coeff[1].dtype == {torch.float64: torch.complex128}.get(dtype, torch.complex32)
+    coeff_numpy = SCFpyr_NumPy(height=4, nbands=4).build(im)
+    coeff_double = [c.to(torch.complex128 if c.is_complex() else torch.float64) for c in coeff]
+    assert_coeff_close(coeff_numpy, coeff_double, atol=atol)
+    reconstruction = pyr.reconstruct(coeff)
+    assert reconstruction.dtype == dtype
+    assert np.abs(reconstruction[0].double().numpy() - im).max() < atol_reconstruction
@@ -0,0 +1,110 @@
+# MIT License
+#
+# Copyright (c) 2018 Tom Runia
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to conditions.
+#
+# Author: Tom Runia
+# Date Created: 2026-10-16
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import pytest
+import torch
+
+from steerable.SCFpyr_PyTorch import SCFpyr_PyTorch
+from steerable.store import PyramidStoreWriter, PyramidStoreReader
+
+################################################################################
+
+def write_store(path, num_batches=2, batch_size=3):
+    torch.manual_seed(0)
+    pyr = SCFpyr_PyTorch(height=3, nbands=4)
+    coeffs = [pyr.build(torch.rand(batch_size, 1, 64, 80)) for _ in range(num_batches)]
+    with PyramidStoreWriter(str(path), metadata={'height': 3, 'nbands': 4}) as writer:
+        for coeff in coeffs:
+            writer.append(coeff)
+    return pyr, coeffs
+
+def test_store_random_access(tmp_path):
+    _, coeffs = write_store(tmp_path)
+    reader = PyramidStoreReader(str(tmp_path))
+    assert len(reader) == 6
+    assert reader.metadata == {'height': 3, 'nbands': 4}
+    assert torch.equal(reader[4,1,2], coeffs[1][1][1,2])
+    assert torch.equal(reader[0,0], coeffs[0][0][0])
+    assert torch.equal(reader[5,-1], coeffs[1][-1][2])
+
+def test_store_integer_indices(tmp_path):
+    _, coeffs = write_store(tmp_path)
+    reader = PyramidStoreReader(str(tmp_path))
+    assert torch.equal(reader[-1,1,2], coeffs[1][1][2,2])
+    assert torch.equal(reader[np.int64(4),1,2], coeffs[1][1][1,2])
+    assert torch.equal(reader[np.int32(-6),0], coeffs[0][0][0])
+    assert reader[np.int64(2)].batch_size == 1 and reader.coeffs(-2).batch_size == 1
+    with pytest.raises(IndexError):
+        reader[6,0]
+    with pytest.raises(IndexError):
+        reader[-7,0]
+
+def test_store_numpy_views(tmp_path):
+    _, coeffs = write_store(tmp_path)
+    reader = PyramidStoreReader(str(tmp_path))
+    band = reader.numpy(4, 1, 2)
+    assert band.dtype == np.complex64
+    assert np.shares_memory(band, reader.data)
+    assert np.array_equal(band, coeffs[1][1][1,2].numpy())
+
+def test_store_append_and_reconstruct(tmp_path):
+    pyr, coeffs = write_store(tmp_path)
+    im_batch = torch.rand(2, 1, 64, 80)
+    with PyramidStoreWriter(str(tmp_path)) as writer:
+        assert writer.append(pyr.build(im_batch)) == 6
+    reader = PyramidStoreReader(str(tmp_path))
+    assert len(reader) == 8
+    assert torch.allclose(pyr.reconstruct(reader.coeffs(slice(6, 8))), im_batch[:,0], atol=1e-4)
+    assert torch.equal(pyr.reconstruct(reader[3:6]), pyr.reconstruct(coeffs[1]))
+
+def test_store_rejects_other_layout(tmp_path):
+    write_store(tmp_path)
+    with PyramidStoreWriter(str(tmp_path)) as writer:
+        with pytest.raises(ValueError):
+            writer.append(SCFpyr_PyTorch(height=3, nbands=6).build(torch.rand(1, 1, 64, 80)))
+
+def test_store_recovers_interrupted_append(tmp_path):
+    pyr, coeffs = write_store(tmp_path)
+    data_file = tmp_path / 'coeffs.bin'
+    size = data_file.stat().st_size
+    with open(str(data_file), 'ab') as f:
+        f.write(b'\0' * 1000)  # data written, index not updated
+    im_batch = torch.rand(1, 1, 64, 80)
+    with PyramidStoreWriter(str(tmp_path)) as writer:
+        assert data_file.stat().st_size == size
+        assert writer.append(pyr.build(im_batch)) == 6
+    reader = PyramidStoreReader(str(tmp_path))
+    assert len(reader) == 7
+    assert torch.equal(reader[6,0], pyr.build(im_batch)[0][0])
+    assert torch.equal(reader[5,-1], coeffs[1][-1][2])
+
+def test_store_rejects_truncated_data(tmp_path):
+    write_store(tmp_path)
+    data_file = tmp_path / 'coeffs.bin'
+    with open(str(data_file), 'r+b') as f:
+        f.truncate(data_file.stat().st_size - 8)
+    with pytest.raises(ValueError):
+        PyramidStoreWriter(str(tmp_path))
+
+def test_store_streaming_reconstruction(tmp_path):
+    pyr, coeffs = write_store(tmp_path)
+    reader = PyramidStoreReader(str(tmp_path))
+    levels = reader.iter_levels(slice(3, 6), coarse_to_fine=True)
+    reconstruction = pyr.reconstruct_stream(levels, (64, 80))
+    assert torch.allclose(reconstruction, pyr.reconstruct(coeffs[1]), atol=1e-6)
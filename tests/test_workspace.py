@@ -0,0 +1,86 @@
+# MIT License
+#
+# Copyright (c) 2018 Tom Runia
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to conditions.
+#
+# Author: Tom Runia
+# Date Created: 2026-10-16
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import pytest
+import torch
+from torch.profiler import profile, ProfilerActivity
+
+from steerable.SCFpyr_PyTorch import SCFpyr_PyTorch, flatten_coeff
+from steerable.workspace import Workspace
+
+################################################################################
+
+@pytest.mark.parametrize('downsample_bands', [False, True])
+@pytest.mark.parametrize('dtype', [torch.float32, torch.float16])
+def test_workspace_matches_build(downsample_bands, dtype):
+    torch.manual_seed(0)
+    im_batch = torch.rand(2, 1, 64, 80).to(dtype)
+    pyr = SCFpyr_PyTorch(height=4, nbands=4, downsample_bands=downsample_bands)
+    workspace = Workspace()
+    coeff = pyr.build(im_batch)
+    coeff_workspace = pyr.build(im_batch, workspace=workspace)
+    for t, t_workspace in zip(flatten_coeff(coeff)[0], flatten_coeff(coeff_workspace)[0]):
+        assert torch.equal(t.to(torch.complex128), t_workspace.to(torch.complex128))
+    reconstruction = pyr.reconstruct(coeff_workspace, workspace=workspace)
+    assert torch.equal(reconstruction, pyr.reconstruct(coeff))
+
+def test_workspace_steady_state_allocations():
+    pyr = SCFpyr_PyTorch(height=5, nbands=4, scale_factor=4)
+    workspace = Workspace()
+    for i in range(3):
+        im_batch = torch.rand(2, 1, 128, 128)
+        coeff = pyr.build(im_batch, workspace=workspace)
+        pyr.reconstruct(coeff, workspace=workspace)
+        if i == 0:
+            allocations, nbytes = workspace.allocations, workspace.nbytes
+    assert workspace.allocations == allocations and workspace.nbytes == nbytes
+
+@pytest.mark.parametrize('dtype', [torch.float32, torch.float16])
+def test_workspace_only_ffts_allocate(dtype):
+    # Allocator traffic of a repeated call, all of it inside torch.fft
+    pyr = SCFpyr_PyTorch(height=5, nbands=8)
+    im_batch = torch.rand(4, 1, 128, 128).to(dtype)
+    workspace = Workspace()
+    coeff = pyr.build(im_batch, workspace=workspace)
+    pyr.reconstruct(coeff, workspace=workspace)
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        coeff = pyr.build(im_batch, workspace=workspace)
+        pyr.reconstruct(coeff, workspace=workspace)
+
+    def in_fft(event):
+        while event is not None:
+            if event.name.startswith('aten::_fft_'):
+                return True
+            event = event.cpu_parent
+        return False
+
+    # Scalars such as the 0.5 of the Hermitian part are wrapped in tensors
+    allocations = [e for e in prof.events() if e.self_cpu_memory_usage > 64]
+    assert allocations and all(in_fft(e) for e in allocations)
+
+def test_build_into_out_buffers():
+    im_batch = torch.rand(3, 1, 64, 64)
+    pyr = SCFpyr_PyTorch(height=4, nbands=4)
+    plan = pyr.plan(im_batch.shape)
+    out = plan.empty_coeff(3)
+    assert pyr.build(im_batch, out=out) is out
+    reconstruction = torch.empty(3, 64, 64)
+    pyr.reconstruct(out, out=reconstruction)
+    assert torch.allclose(reconstruction, im_batch[:,0], atol=1e-4)
+    with pytest.raises(AssertionError):
+        pyr.build(im_batch.requires_grad_(), out=out)